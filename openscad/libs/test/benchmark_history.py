@@ -0,0 +1,325 @@
+#! /usr/bin/env python3
+'''
+Local history of the scad dictionary benchmarks, and a regression check.
+
+Results from dict_benchmark.py are appended to a JSON lines history file,
+keyed by the git commit and the OpenSCAD version:
+
+    python dict_benchmark.py -o results.json
+    python benchmark_history.py record results.json
+
+A later set of results can then be compared to a chosen baseline commit. The
+exit code is 1 if any scenario is significantly slower, so this can be used to
+gate a merge:
+
+    python benchmark_history.py compare --baseline main
+
+The exit code is 2 if the results can't be compared, including when there
+are too few repeats for a slowdown to ever be significant.
+
+Everything runs offline, significance is tested with an exact Mann-Whitney U
+test on the per operation times of each repeat.
+'''
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from itertools import combinations
+from math import comb, erf, sqrt
+from statistics import median
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_HISTORY = os.path.join(THIS_DIR, "benchmark_history.jsonl")
+
+
+def git_revision(rev="HEAD"):
+    """
+    Return the full commit hash for a git revision, or None if it can't be resolved.
+    """
+    result = subprocess.run(
+        ["git", "rev-parse", "--verify", "--quiet", rev + "^{commit}"],
+        check=False,
+        capture_output=True,
+        text=True,
+        cwd=THIS_DIR
+    )
+    return result.stdout.strip() or None
+
+def git_is_dirty():
+    """
+    Return true if the working tree has uncommitted changes to tracked files.
+    """
+    result = subprocess.run(
+        ["git", "status", "--porcelain", "--untracked-files=no"],
+        check=False,
+        capture_output=True,
+        text=True,
+        cwd=THIS_DIR
+    )
+    return bool(result.stdout.strip())
+
+def load_history(path):
+    """
+    Load all entries from the history file, oldest first.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as file_obj:
+        return [json.loads(line) for line in file_obj if line.strip()]
+
+def record(results_path, history_path):
+    """
+    Append a results file from dict_benchmark.py to the history.
+    """
+    with open(results_path, 'r') as file_obj:
+        report = json.load(file_obj)
+    entry = {
+        "commit": git_revision(),
+        "dirty": git_is_dirty(),
+        "openscad_version": report["openscad_version"],
+        "recorded": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "report": report,
+    }
+    with open(history_path, 'a') as file_obj:
+        file_obj.write(json.dumps(entry) + "\n")
+    return entry
+
+def per_operation_samples(result):
+    """
+    The per operation time for each repeat of a benchmark result. The run and
+    baseline samples were interleaved so they are paired up.
+    """
+    return [
+        (run - baseline)/result["operations"]
+        for run, baseline in zip(result["run"]["samples"], result["baseline"]["samples"])
+    ]
+
+def mann_whitney_greater(candidate, baseline):
+    """
+    One sided Mann-Whitney U test that `candidate` tends to be larger than
+    `baseline`. Returns the p-value. For small samples the exact distribution
+    is found by enumerating every split of the pooled ranks, otherwise the
+    normal approximation is used.
+    """
+    n_c = len(candidate)
+    n_b = len(baseline)
+    if n_c == 0 or n_b == 0:
+        return 1.0
+    pooled = sorted(candidate + baseline)
+
+    def ranks_of(values):
+        # Average ranks for ties
+        ranks = []
+        for value in values:
+            lower = sum(1 for other in pooled if other < value)
+            equal = sum(1 for other in pooled if other == value)
+            ranks.append(lower + (equal + 1)/2)
+        return ranks
+
+    all_ranks = ranks_of(pooled)
+    u_stat = sum(ranks_of(candidate)) - n_c*(n_c + 1)/2
+    if comb(n_c + n_b, n_c) <= 50000:
+        count = 0
+        total = 0
+        for chosen in combinations(range(n_c + n_b), n_c):
+            u_perm = sum(all_ranks[i] for i in chosen) - n_c*(n_c + 1)/2
+            total += 1
+            if u_perm >= u_stat - 1e-9:
+                count += 1
+        return count/total
+    mean = n_c*n_b/2
+    std = sqrt(n_c*n_b*(n_c + n_b + 1)/12)
+    z_score = (u_stat - 0.5 - mean)/std
+    return 0.5*(1 - erf(z_score/sqrt(2)))
+
+def smallest_p_value(n_c, n_b):
+    """
+    The smallest p-value mann_whitney_greater can give for samples of these
+    sizes, when every candidate sample is larger than every baseline one. With
+    too few repeats this is above any useful significance level.
+    """
+    return mann_whitney_greater(list(range(n_b, n_b + n_c)), list(range(n_b)))
+
+def find_entry(history, commit=None, openscad_version=None):
+    """
+    Return the most recent entry matching the commit (if given) and the
+    OpenSCAD version (if given), or None.
+    """
+    for entry in reversed(history):
+        if commit is not None and entry["commit"] != commit:
+            continue
+        if openscad_version is not None and entry["openscad_version"] != openscad_version:
+            continue
+        return entry
+    return None
+
+def compare(baseline_entry, candidate_entry, threshold, alpha):
+    """
+    Compare every scenario and size that is in both entries.
+    A regression is a slowdown of the median per operation time by more than
+    `threshold` (as a fraction) that is significant at the `alpha` level.
+    Returns a list of comparison dictionaries.
+    """
+    baseline_results = {
+        (result["scenario"], result["size"]): result
+        for result in baseline_entry["report"]["results"]
+    }
+    comparisons = []
+    for result in candidate_entry["report"]["results"]:
+        key = (result["scenario"], result["size"])
+        if key not in baseline_results:
+            continue
+        base_samples = per_operation_samples(baseline_results[key])
+        cand_samples = per_operation_samples(result)
+        base_median = median(base_samples)
+        cand_median = median(cand_samples)
+        # The net times can be tiny (or negative) for fast operations, so the
+        # change is relative to the size of the run not just the net time.
+        scale = max(abs(base_median), 1e-9)
+        change = (cand_median - base_median)/scale
+        p_value = mann_whitney_greater(cand_samples, base_samples)
+        comparisons.append({
+            "scenario": key[0],
+            "size": key[1],
+            "baseline_median": base_median,
+            "candidate_median": cand_median,
+            "change": change,
+            "p_value": p_value,
+            "smallest_p_value": smallest_p_value(len(cand_samples), len(base_samples)),
+            "regression": change > threshold and p_value < alpha,
+        })
+    return comparisons
+
+def print_comparisons(comparisons):
+    """
+    Print a table of the comparisons
+    """
+    for comp in comparisons:
+        flag = "SLOWER" if comp["regression"] else "ok"
+        print(
+            f"{comp['scenario']:<24} {comp['size']:>7} keys: "
+            f"{comp['baseline_median']*1000:9.3f} -> {comp['candidate_median']*1000:9.3f} ms "
+            f"({comp['change']*100:+7.1f}%, p={comp['p_value']:.3f}) {flag}"
+        )
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Benchmark history for the scad dictionaries.")
+    parser.add_argument(
+        "--history",
+        default=DEFAULT_HISTORY,
+        help="History file to use."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="Add results to the history.")
+    record_parser.add_argument("results", help="JSON results from dict_benchmark.py")
+
+    subparsers.add_parser("list", help="List the entries in the history.")
+
+    compare_parser = subparsers.add_parser("compare", help="Check for slowdowns.")
+    compare_parser.add_argument(
+        "--baseline",
+        required=True,
+        help="Git revision of the baseline results."
+    )
+    compare_parser.add_argument(
+        "--candidate",
+        default=None,
+        help="Git revision or JSON results file to check, defaults to the latest entry."
+    )
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Fractional slowdown that counts as a regression."
+    )
+    compare_parser.add_argument(
+        "--alpha",
+        type=float,
+        default=0.05,
+        help="Significance level for the slowdown."
+    )
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Run the requested command, returning the exit code.
+    """
+    args = parse_args(argv)
+    history = load_history(args.history)
+
+    if args.command == "record":
+        entry = record(args.results, args.history)
+        print(f"Recorded results for {entry['commit']} ({entry['openscad_version']})")
+        return 0
+
+    if args.command == "list":
+        for entry in history:
+            dirty = " (dirty)" if entry["dirty"] else ""
+            print(f"{entry['recorded']}  {entry['commit']}{dirty}  {entry['openscad_version']}")
+        return 0
+
+    if args.candidate is not None and os.path.isfile(args.candidate):
+        with open(args.candidate, 'r') as file_obj:
+            report = json.load(file_obj)
+        candidate = {
+            "commit": None,
+            "openscad_version": report["openscad_version"],
+            "report": report,
+        }
+    elif args.candidate is not None:
+        candidate_commit = git_revision(args.candidate)
+        if candidate_commit is None:
+            print(f"Unknown revision {args.candidate}.", file=sys.stderr)
+            return 2
+        candidate = find_entry(history, commit=candidate_commit)
+    else:
+        candidate = history[-1] if history else None
+    if candidate is None:
+        print("No candidate results found.", file=sys.stderr)
+        return 2
+
+    baseline_commit = git_revision(args.baseline)
+    if baseline_commit is None:
+        print(f"Unknown revision {args.baseline}.", file=sys.stderr)
+        return 2
+    # Only compare results from the same version of OpenSCAD
+    baseline = find_entry(history, baseline_commit, candidate["openscad_version"])
+    if baseline is None:
+        print(
+            f"No results for {args.baseline} with {candidate['openscad_version']}.",
+            file=sys.stderr
+        )
+        return 2
+    if baseline is candidate:
+        print(
+            f"The candidate is the baseline results for {args.baseline}, give a different "
+            "--baseline or --candidate.",
+            file=sys.stderr
+        )
+        return 2
+
+    comparisons = compare(baseline, candidate, args.threshold, args.alpha)
+    print_comparisons(comparisons)
+    unreachable = [comp for comp in comparisons if comp["smallest_p_value"] >= args.alpha]
+    if unreachable:
+        print(
+            f"Too few repeats to find a slowdown at alpha={args.alpha:g} (the smallest p-value "
+            f"possible is {max(comp['smallest_p_value'] for comp in unreachable):.3f}), "
+            "run dict_benchmark.py with more --repeats.",
+            file=sys.stderr
+        )
+        return 2
+    if any(comp["regression"] for comp in comparisons):
+        print("Significant slowdowns found!")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+#! /usr/bin/env python3
+'''
+Benchmarks for the scad dictionaries.
+
+Each scenario builds a dictionary of a given size and then runs a number of
+operations on it. Every run is paired with a baseline run that builds the same
+dictionary but does no operations, so that OpenSCAD start up, parsing and
+building the dictionary can be subtracted. Each run is repeated and the median
+and interquartile range are reported, along with the growth rate between
+sizes, the exponent k in t ~ n^k (close to 1 for n*log(n) scaling and 2 for
+quadratic).
+
+Results are written as JSON, for example:
+
+    python dict_benchmark.py --sizes 10 100 1000 10000 --repeats 5 -o results.json
+'''
+
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from tempfile import mkstemp
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+LIBDICT_PATH = os.path.join(THIS_DIR, "..", "libdict.scad")
+# The scad files are not next to the library so use an absolute path.
+# OpenSCAD wants forward slashes even on Windows.
+DEFAULT_SCAD = f"use <{os.path.abspath(LIBDICT_PATH).replace(os.sep, '/')}>\n"
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+
+# Each scenario has a function to build the dictionary and a function that
+# returns the scad for operation number `i` on a dictionary of size `n`
+# The result of each operation is assigned to r{i}.
+SCENARIOS = {
+    "key_lookup": (
+        lambda n: f"dict_raw({n})",
+        lambda i, n: f'key_lookup(str("key", {(i*7919)%n}), dict)'
+    ),
+    "key_lookup_checked": (
+        lambda n: f"checked_dict(dict_raw({n}))",
+        lambda i, n: f'key_lookup(str("key", {(i*7919)%n}), dict)'
+    ),
+    "key_lookup_sorted": (
+        lambda n: f"sorted_dict(dict_raw({n}))",
+        lambda i, n: f'key_lookup(str("key", {(i*7919)%n}), dict)'
+    ),
+    "valid_dict": (
+        lambda n: f"dict_raw({n})",
+        lambda i, n: "valid_dict(dict)"
+    ),
+    "replace_value": (
+        lambda n: f"dict_raw({n})",
+        lambda i, n: f'replace_value(str("key", {(i*7919)%n}), {i}, dict)'
+    ),
+    "replace_multiple_values": (
+        lambda n: f"dict_raw({n})",
+        lambda i, n: (
+            'replace_multiple_values(['
+            + ", ".join(f'[str("key", {((i*10+j)*7919)%n}), {j}]' for j in range(min(10, n)))
+            + '], dict)'
+        )
+    ),
+}
+
+
+def scenario_scad(scenario, size, operations):
+    """
+    Return the scad for a scenario. If operations is 0 this is the baseline
+    which only builds the dictionary.
+    """
+    make_dict, operation = SCENARIOS[scenario]
+    scad = DEFAULT_SCAD
+    scad += 'function dict_raw(n) = [for (i = [0:1:n-1]) [str("key", i), i]];\n'
+    scad += f"dict = {make_dict(size)};\n"
+    for i in range(operations):
+        scad += f"r{i} = {operation(i, size)};\n"
+    # Echo something that depends on the dictionary so we can check it ran
+    scad += f'echo("done", len(dict){", r0 != undef" if operations else ""});\n'
+    return scad
+
+def time_scad(scad, timeout=None):
+    """
+    Run a scad file with OpenSCAD and return the wall time taken.
+    Raises a RuntimeError if OpenSCAD reports an error or does not echo.
+    """
+    scad_descriptor, scad_path = mkstemp(suffix='.scad')
+    echo_descriptor, echo_path = mkstemp(suffix='.echo')
+    try:
+        with open(scad_path, 'w') as file_obj:
+            file_obj.write(scad)
+        start_time = time.perf_counter()
+        subprocess.run(
+            ["openscad", "-o", echo_path, scad_path],
+            check=True,
+            timeout=timeout,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        delta_t = time.perf_counter() - start_time
+        with open(echo_path, 'r') as file_obj:
+            output = file_obj.read()
+    finally:
+        os.close(scad_descriptor)
+        os.close(echo_descriptor)
+        os.remove(scad_path)
+        os.remove(echo_path)
+    if 'ERROR:' in output or 'ECHO: "done"' not in output:
+        raise RuntimeError("OpenSCAD failed to run benchmark:\n" + output)
+    return delta_t
+
+def summarise(samples):
+    """
+    Return the median and interquartile range of a list of times.
+    """
+    if len(samples) > 1:
+        quartiles = statistics.quantiles(samples, n=4, method='inclusive')
+        iqr = quartiles[2] - quartiles[0]
+    else:
+        iqr = 0.0
+    return {"median": statistics.median(samples), "iqr": iqr, "samples": samples}
+
+def openscad_version():
+    """
+    Return the OpenSCAD version string, OpenSCAD prints this to stderr.
+    """
+    result = subprocess.run(
+        ["openscad", "--version"],
+        check=False,
+        capture_output=True,
+        text=True
+    )
+    return (result.stderr or result.stdout).strip()
+
+def run_benchmark(scenario, size, operations, repeats, timeout=None):
+    """
+    Time a scenario against its baseline. The baseline and scenario runs are
+    interleaved so that any drift in the machine's speed affects both.
+    """
+    if operations < 1:
+        raise ValueError("A benchmark needs at least one operation")
+    baseline_scad = scenario_scad(scenario, size, 0)
+    run_scad = scenario_scad(scenario, size, operations)
+    baseline_samples = []
+    run_samples = []
+    for _ in range(repeats):
+        baseline_samples.append(time_scad(baseline_scad, timeout))
+        run_samples.append(time_scad(run_scad, timeout))
+    baseline = summarise(baseline_samples)
+    run = summarise(run_samples)
+    net = run["median"] - baseline["median"]
+    return {
+        "scenario": scenario,
+        "size": size,
+        "operations": operations,
+        "repeats": repeats,
+        "baseline": baseline,
+        "run": run,
+        "net_median": net,
+        "per_operation": net/operations,
+    }
+
+def growth_exponent(previous, current):
+    """
+    The exponent k in t ~ n^k between two results of a scenario at different
+    sizes, from their net times. For valid_dict (which is dominated by
+    is_unique) this should be close to 1 for n*log(n) scaling and close to 2
+    for quadratic scaling. None if either net time is too small to measure.
+    """
+    if previous["net_median"] <= 0 or current["net_median"] <= 0:
+        return None
+    return math.log(current["net_median"]/previous["net_median"])/math.log(current["size"]/previous["size"])
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the scad dictionaries.")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SIZES,
+        help="Number of keys in each dictionary."
+    )
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=list(SCENARIOS),
+        default=list(SCENARIOS),
+        help="Scenarios to run."
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=5,
+        help="Number of times each run is repeated."
+    )
+    parser.add_argument(
+        "--operations",
+        type=int,
+        default=20,
+        help="Number of operations in each run."
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="Timeout in seconds for each OpenSCAD run."
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=None,
+        help="File to write the JSON results to, defaults to stdout."
+    )
+    args = parser.parse_args(argv)
+    if args.operations < 1 or args.repeats < 1:
+        parser.error("--operations and --repeats must be at least 1")
+    return args
+
+def main(argv=None):
+    """
+    Run the requested benchmarks and write the results as JSON.
+    """
+    args = parse_args(argv)
+    results = []
+    for scenario in args.scenarios:
+        previous = None
+        for size in sorted(args.sizes):
+            try:
+                result = run_benchmark(
+                    scenario, size, args.operations, args.repeats, args.timeout
+                )
+            except (RuntimeError, subprocess.SubprocessError) as err:
+                print(f"{scenario} with {size} keys failed: {err}", file=sys.stderr)
+                continue
+            result["growth"] = None if previous is None else growth_exponent(previous, result)
+            growth = "" if result["growth"] is None else f" (growth n^{result['growth']:.2f})"
+            print(
+                f"{scenario:<24} {size:>7} keys: {result['per_operation']*1000:9.3f} ms per "
+                f"operation (median run {result['run']['median']:.3f}s "
+                f"IQR {result['run']['iqr']:.3f}s){growth}",
+                file=sys.stderr
+            )
+            results.append(result)
+            previous = result
+    report = {
+        "openscad_version": openscad_version(),
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as file_obj:
+            json.dump(report, file_obj, indent=2)
+    return report
+
+if __name__ == "__main__":
+    main()
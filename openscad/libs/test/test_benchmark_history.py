@@ -0,0 +1,195 @@
+#! /usr/bin/env python3
+'''
+Tests for the statistics behind the benchmark regression check. These don't
+need OpenSCAD:
+
+    python test_benchmark_history.py
+'''
+
+import json
+import os
+import shutil
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from tempfile import mkdtemp
+
+import benchmark_history
+
+
+def make_entry(per_operation_times, commit=None, operations=10):
+    """
+    A history entry with one valid_dict result whose repeats took
+    `per_operation_times` seconds per operation on top of a 1s baseline.
+    """
+    return {
+        "commit": commit,
+        "dirty": False,
+        "openscad_version": "OpenSCAD version 2021.01",
+        "recorded": "2026-01-01T00:00:00",
+        "report": {
+            "openscad_version": "OpenSCAD version 2021.01",
+            "results": [{
+                "scenario": "valid_dict",
+                "size": 1000,
+                "operations": operations,
+                "baseline": {"samples": [1.0]*len(per_operation_times)},
+                "run": {"samples": [1.0 + time*operations for time in per_operation_times]},
+            }],
+        },
+    }
+
+
+class TestMannWhitney(unittest.TestCase):
+    """
+    The exact and approximate one sided Mann-Whitney U test
+    """
+    def test_separated(self):
+        """
+        When every candidate sample is larger the p-value is 1/C(n_c + n_b, n_c)
+        """
+        self.assertAlmostEqual(benchmark_history.mann_whitney_greater([4, 5, 6], [1, 2, 3]), 1/20)
+        self.assertAlmostEqual(
+            benchmark_history.mann_whitney_greater([6, 7, 8, 9, 10], [1, 2, 3, 4, 5]),
+            1/252
+        )
+
+    def test_faster(self):
+        """
+        A candidate that is faster is not significantly slower
+        """
+        self.assertAlmostEqual(benchmark_history.mann_whitney_greater([1, 2, 3], [4, 5, 6]), 1.0)
+
+    def test_ties(self):
+        """
+        Identical samples are not significant
+        """
+        self.assertAlmostEqual(benchmark_history.mann_whitney_greater([2, 2, 2], [2, 2, 2]), 1.0)
+
+    def test_empty(self):
+        """
+        No samples gives a p-value of 1
+        """
+        self.assertEqual(benchmark_history.mann_whitney_greater([], [1, 2]), 1.0)
+
+    def test_normal_approximation(self):
+        """
+        Large samples use the normal approximation, which agrees on direction
+        """
+        slower = benchmark_history.mann_whitney_greater(list(range(10, 20)), list(range(10)))
+        faster = benchmark_history.mann_whitney_greater(list(range(10)), list(range(10, 20)))
+        self.assertLess(slower, 1e-3)
+        self.assertGreater(faster, 0.999)
+
+    def test_smallest_p_value(self):
+        """
+        Three repeats can never be significant at 0.05, five can
+        """
+        self.assertAlmostEqual(benchmark_history.smallest_p_value(3, 3), 0.05)
+        self.assertLess(benchmark_history.smallest_p_value(5, 5), 0.05)
+
+
+class TestCompare(unittest.TestCase):
+    """
+    Comparing a candidate with a baseline
+    """
+    baseline = [0.010, 0.011, 0.009, 0.010, 0.0105]
+
+    def test_slowdown(self):
+        """
+        A large, consistent slowdown is a regression
+        """
+        slower = [time*1.5 for time in self.baseline]
+        comp, = benchmark_history.compare(make_entry(self.baseline), make_entry(slower), 0.1, 0.05)
+        self.assertAlmostEqual(comp["change"], 0.5)
+        self.assertTrue(comp["regression"])
+
+    def test_small_slowdown(self):
+        """
+        A consistent slowdown below the threshold is not a regression
+        """
+        baseline = [0.0100, 0.0101, 0.0102, 0.0103, 0.0104]
+        slower = [0.0106, 0.0107, 0.0108, 0.0109, 0.0110]
+        comp, = benchmark_history.compare(make_entry(baseline), make_entry(slower), 0.1, 0.05)
+        self.assertLess(comp["p_value"], 0.05)
+        self.assertFalse(comp["regression"])
+
+    def test_no_change(self):
+        """
+        The same times are not a regression
+        """
+        comp, = benchmark_history.compare(
+            make_entry(self.baseline), make_entry(self.baseline), 0.1, 0.05
+        )
+        self.assertFalse(comp["regression"])
+
+    def test_too_few_repeats(self):
+        """
+        With three repeats a slowdown can't be significant at 0.05
+        """
+        comp, = benchmark_history.compare(
+            make_entry(self.baseline[:3]), make_entry([0.1, 0.2, 0.3]), 0.1, 0.05
+        )
+        self.assertFalse(comp["regression"])
+        self.assertGreaterEqual(comp["smallest_p_value"], 0.05)
+
+
+class TestMain(unittest.TestCase):
+    """
+    The compare command refuses comparisons that can't fail
+    """
+    def setUp(self):
+        self.folder = mkdtemp()
+        self.history = os.path.join(self.folder, "history.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def run_compare(self, entries, *args):
+        """
+        Write `entries` to the history and run compare against HEAD, returning
+        the exit code
+        """
+        with open(self.history, 'w') as file_obj:
+            for entry in entries:
+                file_obj.write(json.dumps(entry) + "\n")
+        with redirect_stdout(StringIO()), redirect_stderr(StringIO()):
+            return benchmark_history.main(
+                ["--history", self.history, "compare", "--baseline", "HEAD", *args]
+            )
+
+    def write_candidate(self, times):
+        """
+        Write dict_benchmark.py results to a file, returning its path
+        """
+        path = os.path.join(self.folder, "results.json")
+        with open(path, 'w') as file_obj:
+            json.dump(make_entry(times)["report"], file_obj)
+        return path
+
+    def test_candidate_is_baseline(self):
+        """
+        The latest entry is not compared with itself
+        """
+        head = benchmark_history.git_revision()
+        self.assertEqual(self.run_compare([make_entry([0.01]*5, head)]), 2)
+
+    def test_regression(self):
+        """
+        A slower candidate fails the check
+        """
+        head = benchmark_history.git_revision()
+        candidate = self.write_candidate([0.02, 0.021, 0.019, 0.02, 0.022])
+        self.assertEqual(self.run_compare([make_entry([0.01]*5, head)], "--candidate", candidate), 1)
+
+    def test_too_few_repeats(self):
+        """
+        Results that could never be significant are an error, not a pass
+        """
+        head = benchmark_history.git_revision()
+        candidate = self.write_candidate([0.01]*3)
+        self.assertEqual(self.run_compare([make_entry([0.01]*3, head)], "--candidate", candidate), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
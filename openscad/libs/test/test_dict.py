@@ -1,35 +1,68 @@
 #! /usr/bin/env python3
 '''
 Using Python's unittest to test the scad dictionaries!
+
+Every test writes its scad to its own scratch file so the tests can be run
+in parallel. To run the OpenSCAD processes across a pool of worker threads use:
+
+    python test_dict.py --workers 8
+
+The number of workers can also be set with the LIBDICT_TEST_WORKERS environment
+variable. Results are always reported in the order the tests were loaded.
+
+Most of the time spent is OpenSCAD starting up and parsing libdict.scad. Batch
+mode packs many tests into one scad file, each test wrapped in its own module and
+separated by echo sentinels, so that the output can be mapped back to each test:
+
+    python test_dict.py --batch --workers 4
+
+Tests that expect errors are always run on their own, as a failed assert stops
+OpenSCAD and would hide the tests after it. If a batch stops early any tests
+without output are rerun on their own.
 '''
 
+import argparse
 import subprocess
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from tempfile import mkstemp
 import unittest
 
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+LIBDICT_PATH = os.path.join(THIS_DIR, "..", "libdict.scad")
+# The scad files are not next to the library so use an absolute path.
+# OpenSCAD wants forward slashes even on Windows.
+DEFAULT_SCAD = f"use <{os.path.abspath(LIBDICT_PATH).replace(os.sep, '/')}>\n"
+BATCH_BEGIN = "LIBDICT_BATCH_BEGIN"
+BATCH_END = "LIBDICT_BATCH_END"
 
 
 class BaseTestScadDict(unittest.TestCase):
     """
     Prepended with base so this never runs. Each test should subclass this test
-    This only one test per class otherwise pylint will try to parellelise.
+    Each test gets its own scratch scad and echo files so tests can be run
+    concurrently.
     """
+    # Output of batched runs keyed by the full scad source, see prime_batch_outputs
+    batch_outputs = {}
+
     def setUp(self):
         """
-        Set up a temp file for output and a location for a temporary scad file
+        Set up a temp file for output and a temporary scad file
         This also sets up any default code at the top of the scad file
         """
-        this_dir = os.path.dirname(__file__)
-        self.temp_scad_file = os.path.join(this_dir, "temp.scad")
+        self.scad_descriptor, self.temp_scad_file = mkstemp(suffix='.scad')
         self.temp_descriptor, self.temp_path = mkstemp(suffix='.echo')
-        self.default_scad = "use <../libdict.scad>\n"
+        self.default_scad = DEFAULT_SCAD
 
     def tearDown(self):
         """
-        Close the file descriptor for the temp echo file and delete the fenerated scad file.
+        Close the file descriptors for the temp files and delete them.
         """
         os.close(self.temp_descriptor)
+        os.close(self.scad_descriptor)
+        os.remove(self.temp_path)
         os.remove(self.temp_scad_file)
 
     def run_scad(self, scad, has_warnings=False, has_errors=False):
@@ -38,11 +71,14 @@ class BaseTestScadDict(unittest.TestCase):
         Asserts false unles instructed otherwise.
         """
         scad = self.default_scad + scad
-        with open(self.temp_scad_file, 'w') as file_obj:
-            file_obj.write(scad)
-        subprocess.run(["openscad", "-o", self.temp_path, self.temp_scad_file], check=True)
-        with open(self.temp_path, 'r') as file_obj:
-            output = file_obj.read()
+        if scad in self.batch_outputs:
+            output = self.batch_outputs[scad]
+        else:
+            with open(self.temp_scad_file, 'w') as file_obj:
+                file_obj.write(scad)
+            subprocess.run(["openscad", "-o", self.temp_path, self.temp_scad_file], check=True)
+            with open(self.temp_path, 'r') as file_obj:
+                output = file_obj.read()
         message = (
             "\n\nOpenSCAD input (test.scad) contained:\n" + scad +
             "\n\nOpenSCAD output is below:\n" + output
@@ -50,7 +86,7 @@ class BaseTestScadDict(unittest.TestCase):
         self.assertEqual(has_warnings, warns(output), msg=message)
         self.assertEqual(has_errors, errors(output), msg=message)
 
-# Use a new class for each to force serial execution!
+# One test per class keeps each scad snippet small and the failures easy to read.
 class TestIsInStr1(BaseTestScadDict):
     '''
     Test _is_in_str finds a match
@@ -229,7 +265,7 @@ class TestIsUnique3(BaseTestScadDict):
 class TestIsUnique4(BaseTestScadDict):
     '''
     This tests the edge cases where a list with a first element equal to something else in the
-    list is an errant match. This should be handled by _check_errant_matches. In this we will run
+    list could be an errant match. Lists must only match whole lists. In this we will run
     a number of tests with different numbers of matches. With the lists and numbers in different
     places.
     '''
@@ -279,6 +315,26 @@ class TestIsUnique6(BaseTestScadDict):
                '''
         self.run_scad(scad)
 
+class TestIsUnique7(BaseTestScadDict):
+    '''
+    Larger lists of numbers and strings are unique, until a duplicate is added
+    '''
+    def test(self):
+        '''Must be the only test in the class!'''
+        scad = '''
+               numbers = [for (i = [0:500]) (i*37)%501];
+               strings = [for (i = [0:500]) str("key", (i*37)%501)];
+               assert(is_unique(numbers)==true);
+               assert(is_unique(strings)==true);
+               assert(is_unique(concat(numbers, strings))==true);
+               assert(is_unique(concat(numbers, [250]))==false);
+               assert(is_unique(concat(["key250"], strings))==false);
+               assert(is_unique([[1,2], true, undef, [1,2,3], false])==true);
+               assert(is_unique([true, "true", 1, undef, true])==false);
+               assert(is_unique([undef, 0, undef])==false);
+               '''
+        self.run_scad(scad)
+
 class TestIsPairs1(BaseTestScadDict):
     '''
     Test _is_pairs asserts only returns true for a lists lists where each
@@ -643,6 +699,253 @@ class TestReplaceMultiple2(BaseTestScadDict):
                '''
         self.run_scad(scad, has_errors=True)
 
+class TestCheckedDict1(BaseTestScadDict):
+    """
+    Check a checked dictionary is recognised and can be used for lookup
+    """
+    def test(self):
+        '''Must be the only test in the class!'''
+        scad = '''
+               dict = [["a",3],
+                       ["ab", 22],
+                       ["raisin", 99],
+                       ["great", 4]];
+               c_dict = checked_dict(dict);
+               assert(is_checked_dict(c_dict));
+               assert(!is_checked_dict(dict));
+               assert(valid_dict(c_dict));
+               assert(key_lookup("raisin", c_dict)==99);
+               assert(key_lookup("a", c_dict)==3);
+               '''
+        self.run_scad(scad)
+
+class TestCheckedDict2(BaseTestScadDict):
+    """
+    Check an error is thrown when checking an invalid dictionary
+    """
+    def test(self):
+        '''Must be the only test in the class!'''
+        scad = '''
+               dict = [["a",3],
+                       ["a", 22],
+                       ["raisin", 99],
+                       ["great", 4]];
+               c_dict = checked_dict(dict);
+               '''
+        self.run_scad(scad, has_errors=True)
+
+class TestCheckedDict3(BaseTestScadDict):
+    """
+    Check openscad throws an error on lookup in a checked dictionary when the
+    key is not in the dictionary
+    """
+    def test(self):
+        '''Must be the only test in the class!'''
+        scad = '''
+               c_dict = checked_dict([["a",3],
+                                      ["ab", 22],
+                                      ["raisin", 99],
+                                      ["great", 4]]);
+               val = key_lookup("aa", c_dict);
+               '''
+        self.run_scad(scad, has_errors=True)
+
+class TestCheckedDict4(BaseTestScadDict):
+    """
+    Check that replacing values in a checked dictionary returns a checked
+    dictionary with the values replaced
+    """
+    def test(self):
+        '''Must be the only test in the class!'''
+        scad = '''
+               c_dict = checked_dict([["a",3],
+                                      ["ab", 22],
+                                      ["raisin", 99],
+                                      ["great", 4]]);
+               updated_dict = replace_value("ab", 66, c_dict);
+               assert(is_checked_dict(updated_dict));
+               assert(key_lookup("ab", updated_dict)==66);
+               assert(key_lookup("a", updated_dict)==3);
+               rep_dict = [["great", true],
+                           ["ab", [1,2,4]]];
+               updated_dict2 = replace_multiple_values(rep_dict, c_dict);
+               assert(is_checked_dict(updated_dict2));
+               assert(key_lookup("ab", updated_dict2)==[1,2,4]);
+               assert(key_lookup("great", updated_dict2)==true);
+               assert(key_lookup("raisin", updated_dict2)==99);
+               '''
+        self.run_scad(scad)
+
+class TestSortedDict1(BaseTestScadDict):
+    """
+    Check a sorted dictionary is sorted by key, is also a checked dictionary
+    and gives the same lookups as the dictionary it was made from
+    """
+    def test(self):
+        '''Must be the only test in the class!'''
+        scad = '''
+               dict = [["raisin", 99],
+                       ["ab", 22],
+                       ["great", 4],
+                       ["a", 3],
+                       ["zebra", [1, 2]],
+                       ["b", "bee"]];
+               s_dict = sorted_dict(dict);
+               assert(is_sorted_dict(s_dict));
+               assert(is_checked_dict(s_dict));
+               assert(!is_sorted_dict(checked_dict(dict)));
+               assert(valid_dict(s_dict));
+               assert(_keylist(s_dict[1]) == ["a", "ab", "b", "great", "raisin", "zebra"]);
+               for (key = _keylist(dict)){
+                   assert(key_lookup(key, s_dict) == key_lookup(key, dict));
+               }
+               '''
+        self.run_scad(scad)
+
+class TestSortedDict2(BaseTestScadDict):
+    """
+    Check openscad throws an error on lookup in a sorted dictionary when the
+    key is not in the dictionary
+    """
+    def test(self):
+        '''Must be the only test in the class!'''
+        scad = '''
+               s_dict = sorted_dict([["a",3],
+                                     ["ab", 22],
+                                     ["raisin", 99],
+                                     ["great", 4]]);
+               val = key_lookup("aa", s_dict);
+               '''
+        self.run_scad(scad, has_errors=True)
+
+class TestSortedDict3(BaseTestScadDict):
+    """
+    Check an error is thrown when sorting an invalid dictionary
+    """
+    def test(self):
+        '''Must be the only test in the class!'''
+        scad = '''
+               s_dict = sorted_dict([["a",3],
+                                     ["a", 22],
+                                     ["raisin", 99],
+                                     ["great", 4]]);
+               '''
+        self.run_scad(scad, has_errors=True)
+
+class TestSortedDict4(BaseTestScadDict):
+    """
+    Check that lookups in a large sorted dictionary match lookups in the
+    original dictionary, and that replacing values keeps it sorted
+    """
+    def test(self):
+        '''Must be the only test in the class!'''
+        scad = '''
+               dict = [for (i = [0:200]) [str(i), i*2]];
+               s_dict = sorted_dict(dict);
+               for (i = [0:200]){
+                   assert(key_lookup(str(i), s_dict) == i*2);
+               }
+               updated_dict = replace_multiple_values([["7", "seven"], ["150", true]], s_dict);
+               assert(is_sorted_dict(updated_dict));
+               assert(key_lookup("7", updated_dict) == "seven");
+               assert(key_lookup("150", updated_dict) == true);
+               assert(key_lookup("8", replace_value("8", 0, s_dict)) == 0);
+               '''
+        self.run_scad(scad)
+
+class TestKeyLookupMany1(BaseTestScadDict):
+    """
+    Check key_lookup_many returns the values in the order of the keys for a
+    dictionary, a checked dictionary and a sorted dictionary
+    """
+    def test(self):
+        '''Must be the only test in the class!'''
+        scad = '''
+               dict = [["a",3],
+                       ["ab", 22],
+                       ["raisin", 99],
+                       ["great", 4]];
+               keys = ["great", "a", "raisin", "a"];
+               expected = [4, 3, 99, 3];
+               assert(key_lookup_many(keys, dict) == expected);
+               assert(key_lookup_many(keys, checked_dict(dict)) == expected);
+               assert(key_lookup_many(keys, sorted_dict(dict)) == expected);
+               assert(key_lookup_many([], dict) == []);
+               '''
+        self.run_scad(scad)
+
+class TestKeyLookupMany2(BaseTestScadDict):
+    """
+    Check an error is thrown if any of the keys are not in the dictionary
+    """
+    def test(self):
+        '''Must be the only test in the class!'''
+        scad = '''
+               dict = [["a",3],
+                       ["ab", 22],
+                       ["raisin", 99],
+                       ["great", 4]];
+               val = key_lookup_many(["a", "aa", "great"], dict);
+               '''
+        self.run_scad(scad, has_errors=True)
+
+class TestKeyLookupMany3(BaseTestScadDict):
+    """
+    Check an error is thrown if the keys are not a list of strings
+    """
+    def test(self):
+        '''Must be the only test in the class!'''
+        scad = '''
+               dict = [["a",3],
+                       ["ab", 22],
+                       ["raisin", 99],
+                       ["great", 4]];
+               val = key_lookup_many("ab", dict);
+               '''
+        self.run_scad(scad, has_errors=True)
+
+class TestApplyOverrides1(BaseTestScadDict):
+    """
+    Check apply_overrides makes one checked dictionary for each set of
+    replacements, leaving the other values unchanged
+    """
+    def test(self):
+        '''Must be the only test in the class!'''
+        scad = '''
+               dict = [["a",3],
+                       ["ab", 22],
+                       ["raisin", 99],
+                       ["great", 4]];
+               variants = apply_overrides([[["a", 1]],
+                                           [["great", true], ["ab", [1,2,4]]],
+                                           [["raisin", 0], ["a", 2], ["ab", "x"], ["great", 5]]],
+                                          dict);
+               assert(len(variants)==3);
+               assert(is_checked_dict(variants[0]));
+               assert(key_lookup_many(["a", "ab", "raisin", "great"], variants[0]) == [1, 22, 99, 4]);
+               assert(key_lookup_many(["a", "ab", "raisin", "great"], variants[1]) == [3, [1,2,4], 99, true]);
+               assert(key_lookup_many(["a", "ab", "raisin", "great"], variants[2]) == [2, "x", 0, 5]);
+               '''
+        self.run_scad(scad)
+
+class TestApplyOverrides2(BaseTestScadDict):
+    """
+    Check an error is thrown if any set of replacements has a key not in the
+    dictionary
+    """
+    def test(self):
+        '''Must be the only test in the class!'''
+        scad = '''
+               dict = [["a",3],
+                       ["ab", 22],
+                       ["raisin", 99],
+                       ["great", 4]];
+               variants = apply_overrides([[["a", 1]],
+                                           [["great", true], ["abc", 2]]],
+                                          dict);
+               '''
+        self.run_scad(scad, has_errors=True)
+
 
 def warns(output):
     """
@@ -660,5 +963,255 @@ def errors(output):
         raise RuntimeError("Parser error in unit test")
     return err
 
+class _Collected(Exception):
+    """
+    Raised to stop a test once its scad has been collected for batching.
+    """
+
+def _collect_scad(case):
+    """
+    Call the test method of `case` with run_scad replaced so that it records
+    the scad rather than running it.
+    Returns a tuple of (scad, has_warnings, has_errors) or None if the test
+    did not call run_scad.
+    """
+    collected = []
+    def record(scad, has_warnings=False, has_errors=False):
+        collected.append((DEFAULT_SCAD + scad, has_warnings, has_errors))
+        raise _Collected()
+    case.run_scad = record
+    try:
+        getattr(case, case._testMethodName)()
+    except _Collected:
+        pass
+    finally:
+        del case.run_scad
+    return collected[0] if collected else None
+
+def batch_scad(snippets):
+    """
+    Combine scad snippets into one scad file. Each snippet is wrapped in its own
+    module so that its variables do not clash with the others, and each module
+    call is surrounded by echo sentinels.
+    """
+    scad = DEFAULT_SCAD
+    for i, snippet in enumerate(snippets):
+        scad += f"\nmodule _libdict_batch_case_{i}(){{\n{snippet}\n}}\n"
+    for i in range(len(snippets)):
+        scad += (
+            f'echo("{BATCH_BEGIN} {i}");\n'
+            f"_libdict_batch_case_{i}();\n"
+            f'echo("{BATCH_END} {i}");\n'
+        )
+    return scad
+
+def split_batch_output(output, n_cases):
+    """
+    Split the echo output of a batched scad file into the output for each case.
+    Cases that never finished (because OpenSCAD stopped early) are None.
+    Any output outside of a case is added to every case, as it would have
+    appeared in each of their outputs if they had been run on their own.
+    """
+    case_lines = [[] for _ in range(n_cases)]
+    finished = [False]*n_cases
+    shared_lines = []
+    current = None
+    for line in output.splitlines(keepends=True):
+        if line.startswith(f'ECHO: "{BATCH_BEGIN} '):
+            current = int(line.split()[-1].rstrip('"'))
+        elif line.startswith(f'ECHO: "{BATCH_END} '):
+            index = int(line.split()[-1].rstrip('"'))
+            if index == current:
+                finished[index] = True
+            current = None
+        elif current is None:
+            shared_lines.append(line)
+        else:
+            case_lines[current].append(line)
+    shared = "".join(shared_lines)
+    return [
+        shared + "".join(lines) if done else None
+        for lines, done in zip(case_lines, finished)
+    ]
+
+def run_scad_batch(scad_sources):
+    """
+    Run many scad files (each starting with DEFAULT_SCAD) as one OpenSCAD process.
+    Returns a list with the output of each, or None for any that could not
+    be attributed.
+    """
+    snippets = [scad[len(DEFAULT_SCAD):] for scad in scad_sources]
+    scad_descriptor, scad_path = mkstemp(suffix='.scad')
+    echo_descriptor, echo_path = mkstemp(suffix='.echo')
+    try:
+        with open(scad_path, 'w') as file_obj:
+            file_obj.write(batch_scad(snippets))
+        # Don't check the exit code, a parse error just means nothing is batched.
+        subprocess.run(["openscad", "-o", echo_path, scad_path], check=False)
+        with open(echo_path, 'r') as file_obj:
+            output = file_obj.read()
+    finally:
+        os.close(scad_descriptor)
+        os.close(echo_descriptor)
+        os.remove(scad_path)
+        os.remove(echo_path)
+    return split_batch_output(output, len(snippets))
+
+def prime_batch_outputs(tests, batch_size, workers=1):
+    """
+    Collect the scad from each test, run those not expecting errors in batches
+    of `batch_size` and store each test's output in BaseTestScadDict.batch_outputs.
+    Tests expecting errors, or whose batch stopped before they ran, are left
+    out so that they run on their own.
+    """
+    sources = []
+    for case in tests:
+        if not isinstance(case, BaseTestScadDict):
+            continue
+        collected = _collect_scad(case)
+        if collected is None:
+            continue
+        scad, _, has_errors = collected
+        if not has_errors and scad not in sources:
+            sources.append(scad)
+    batches = [sources[i:i+batch_size] for i in range(0, len(sources), batch_size)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        outputs = list(executor.map(run_scad_batch, batches))
+    for batch, batch_output in zip(batches, outputs):
+        for scad, output in zip(batch, batch_output):
+            if output is not None:
+                BaseTestScadDict.batch_outputs[scad] = output
+
+class _RecordingResult(unittest.TestResult):
+    """
+    Records the outcome of a single test so that it can be replayed later into
+    the real result object. This lets tests finish in any order while the
+    report is still printed in the order the tests were loaded.
+    """
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def addSuccess(self, test):
+        self.calls.append(("addSuccess", (test,)))
+
+    def addFailure(self, test, err):
+        self.calls.append(("addFailure", (test, err)))
+
+    def addError(self, test, err):
+        self.calls.append(("addError", (test, err)))
+
+    def addSkip(self, test, reason):
+        self.calls.append(("addSkip", (test, reason)))
+
+    def addExpectedFailure(self, test, err):
+        self.calls.append(("addExpectedFailure", (test, err)))
+
+    def addUnexpectedSuccess(self, test):
+        self.calls.append(("addUnexpectedSuccess", (test,)))
+
+    def addSubTest(self, test, subtest, err):
+        self.calls.append(("addSubTest", (test, subtest, err)))
+
+    def addDuration(self, test, elapsed):
+        self.calls.append(("addDuration", (test, elapsed)))
+
+    def replay(self, result):
+        """
+        Replay the recorded outcomes into `result`
+        """
+        for name, args in self.calls:
+            getattr(result, name)(*args)
+
+
+def _flatten(suite):
+    """
+    Return a list of all test cases in a (possibly nested) test suite in order.
+    """
+    if isinstance(suite, unittest.TestCase):
+        return [suite]
+    tests = []
+    for test in suite:
+        tests += _flatten(test)
+    return tests
+
+
+class ParallelTextTestRunner(unittest.TextTestRunner):
+    """
+    A text test runner that runs the tests on a pool of worker threads.
+    Threads are enough as each test spends its time waiting on OpenSCAD.
+    """
+    workers = 1
+    # Whether to run tests in batched OpenSCAD runs
+    batch = False
+    # Number of tests per batched run, 0 to split the tests between the workers
+    batch_size = 0
+
+    def run(self, test):
+        """
+        Run the tests on `workers` threads and report in a deterministic order
+        """
+        tests = _flatten(test)
+        if self.batch:
+            # Default to one batch per worker. A batch size larger than the
+            # number of tests just makes one batch.
+            default_size = -(-test.countTestCases() // self.workers)
+            prime_batch_outputs(tests, max(1, self.batch_size or default_size), self.workers)
+        if self.workers <= 1:
+            return super().run(unittest.TestSuite(tests))
+
+        def run_one(case):
+            recorder = _RecordingResult()
+            case(recorder)
+            return recorder
+
+        def run_all(result):
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                # map returns results in the order of the input
+                recorded = list(executor.map(run_one, tests))
+            for case, recorder in zip(tests, recorded):
+                result.startTest(case)
+                recorder.replay(result)
+                result.stopTest(case)
+
+        return super().run(run_all)
+
+
+def _parse_runner_args(argv):
+    """
+    Remove the --workers and batch options from argv, returning the parsed
+    options and the remaining arguments for unittest.
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.environ.get("LIBDICT_TEST_WORKERS", "1")),
+        help="Number of OpenSCAD processes to run at once."
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Run the tests that don't expect errors in batched OpenSCAD runs."
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=0,
+        help="Number of tests per batched run, defaults to splitting them between the workers."
+    )
+    args, remaining = parser.parse_known_args(argv[1:])
+    return args, argv[:1] + remaining
+
+def main():
+    """
+    Run the tests, optionally in parallel and/or batched.
+    """
+    args, argv = _parse_runner_args(sys.argv)
+    ParallelTextTestRunner.workers = max(1, args.workers)
+    ParallelTextTestRunner.batch = args.batch or args.batch_size > 0
+    ParallelTextTestRunner.batch_size = max(0, args.batch_size)
+    unittest.main(argv=argv, testRunner=ParallelTextTestRunner)
+
 if __name__ == '__main__':
-    unittest.main()
+    main()
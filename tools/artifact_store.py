@@ -0,0 +1,221 @@
+#! /usr/bin/env python3
+'''
+A compact, deduplicated store for rendered meshes.
+
+Meshes are stored in canonical form (see stl_canonical.py), so the same mesh
+is only stored once however it was written, under the sha256 of its canonical
+STL. Rather than 50 bytes per triangle each mesh is stored as:
+
+* the distinct vertices, quantised to integers, delta encoded in sorted order,
+* the three vertex indices of each triangle,
+
+compressed with zlib (typically a tenth of the size of the STL). Decoding
+gives back the canonical STL byte for byte. Meshes can also be unpacked to
+.npy files of welded points and faces, which the analysis tools can memory
+map rather than parse again.
+
+    python tools/artifact_store.py add 3Nuts/STLs/3.5/*.stl
+    python tools/artifact_store.py get 8a73f0f6c8 -o interGearBrimmed.stl
+    python tools/artifact_store.py list
+
+The store is kept in ~/.cache/fibreholders/meshes unless MESH_STORE_DIR is set.
+'''
+
+import argparse
+import hashlib
+import io
+import os
+import sys
+import zlib
+from tempfile import mkstemp
+
+import numpy as np
+
+from stl_canonical import DEFAULT_QUANTUM, canonical_triangles, header_for, stl_records
+from stl_mesh import load_triangles
+
+DEFAULT_STORE_DIR = os.environ.get(
+    "MESH_STORE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "fibreholders", "meshes")
+)
+MAGIC = b"FHMESH1\n"
+COMPRESSION_LEVEL = 9
+
+
+def encode_mesh(canonical, quantum=DEFAULT_QUANTUM):
+    """
+    Pack a canonical quantised mesh (an (n, 3, 3) int64 array) into the store
+    format: magic, then a zlib compressed .npz-like block of arrays.
+    """
+    points, faces = np.unique(canonical.reshape(-1, 3), axis=0, return_inverse=True)
+    # Sorted points change slowly, so their differences are small and compress well
+    deltas = np.diff(points, axis=0, prepend=np.zeros((1, 3), dtype=np.int64))
+    index_type = np.uint16 if len(points) <= 1 << 16 else np.uint32
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        quantum=np.float64(quantum),
+        deltas=deltas.astype(np.int32 if np.abs(deltas).max(initial=0) < 1 << 31 else np.int64),
+        faces=faces.reshape(-1, 3).astype(index_type),
+    )
+    return MAGIC + zlib.compress(buffer.getvalue(), COMPRESSION_LEVEL)
+
+def decode_mesh(data):
+    """
+    Unpack stored data into the quantum and the canonical quantised mesh as
+    an (n, 3, 3) int64 array.
+    """
+    if not data.startswith(MAGIC):
+        raise ValueError("Not a stored mesh")
+    with np.load(io.BytesIO(zlib.decompress(data[len(MAGIC):]))) as arrays:
+        quantum = float(arrays["quantum"])
+        points = np.cumsum(arrays["deltas"].astype(np.int64), axis=0)
+        faces = arrays["faces"].astype(np.intp)
+    return quantum, points[faces]
+
+def stl_bytes(quantum, canonical):
+    """
+    The canonical binary STL for a decoded mesh.
+    """
+    records = stl_records(canonical*quantum)
+    return header_for(quantum) + np.uint32(len(records)).tobytes() + records.tobytes()
+
+
+class ArtifactStore:
+    """
+    A folder of compressed canonical meshes named by their content hash.
+    """
+    def __init__(self, store_dir=DEFAULT_STORE_DIR):
+        self.store_dir = store_dir
+        os.makedirs(os.path.join(store_dir, "objects"), exist_ok=True)
+
+    def path_for(self, digest, suffix=".mesh"):
+        """
+        The path a mesh with `digest` is stored at.
+        """
+        return os.path.join(self.store_dir, "objects", digest[:2], digest + suffix)
+
+    def _write(self, path, data):
+        """
+        Write a file atomically so another process never sees half of it.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temp_path = mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+        with os.fdopen(descriptor, 'wb') as file_obj:
+            file_obj.write(data)
+        os.replace(temp_path, path)
+
+    def add(self, stl_path, quantum=DEFAULT_QUANTUM):
+        """
+        Store the mesh in an STL. Returns its digest and whether it was new.
+        """
+        canonical = canonical_triangles(load_triangles(stl_path), quantum)
+        digest = hashlib.sha256(stl_bytes(quantum, canonical)).hexdigest()
+        path = self.path_for(digest)
+        if os.path.exists(path):
+            return digest, False
+        self._write(path, encode_mesh(canonical, quantum))
+        return digest, True
+
+    def digests(self):
+        """
+        Every stored digest, sorted.
+        """
+        found = []
+        objects = os.path.join(self.store_dir, "objects")
+        for folder in os.listdir(objects):
+            for name in os.listdir(os.path.join(objects, folder)):
+                if name.endswith(".mesh"):
+                    found.append(name[:-len(".mesh")])
+        return sorted(found)
+
+    def resolve(self, prefix):
+        """
+        The full digest starting with `prefix`. Raises KeyError if there isn't
+        exactly one.
+        """
+        matches = [digest for digest in self.digests() if digest.startswith(prefix)]
+        if len(matches) != 1:
+            raise KeyError(f"{len(matches)} stored meshes start with {prefix!r}")
+        return matches[0]
+
+    def load(self, digest):
+        """
+        The quantum and canonical quantised mesh stored under `digest`.
+        """
+        with open(self.path_for(digest), 'rb') as file_obj:
+            return decode_mesh(file_obj.read())
+
+    def get(self, digest, output_path):
+        """
+        Write the mesh stored under `digest` to `output_path` as a binary STL.
+        """
+        self._write(output_path, stl_bytes(*self.load(digest)))
+
+    def arrays(self, digest):
+        """
+        The welded "points" (float32, (m, 3)) and "faces" (int32, (n, 3)) of the
+        mesh stored under `digest`, memory mapped from .npy files that are
+        written the first time they are asked for.
+        """
+        paths = {name: self.path_for(digest, f".{name}.npy") for name in ["points", "faces"]}
+        if not all(os.path.exists(path) for path in paths.values()):
+            quantum, canonical = self.load(digest)
+            points, faces = np.unique(canonical.reshape(-1, 3), axis=0, return_inverse=True)
+            arrays = {
+                "points": (points*quantum).astype(np.float32),
+                "faces": faces.reshape(-1, 3).astype(np.int32),
+            }
+            for name, array in arrays.items():
+                buffer = io.BytesIO()
+                np.save(buffer, array)
+                self._write(paths[name], buffer.getvalue())
+        return tuple(np.load(paths[name], mmap_mode="r") for name in ["points", "faces"])
+
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Compressed, deduplicated store for meshes.")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR, help="Folder for the store.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    add = subparsers.add_parser("add", help="Store STLs, printing their digests.")
+    add.add_argument("stls", nargs="+")
+    add.add_argument("--quantum", type=float, default=DEFAULT_QUANTUM, help="Rounding in mm.")
+    get = subparsers.add_parser("get", help="Write a stored mesh as an STL.")
+    get.add_argument("digest", help="Digest, or the start of one.")
+    get.add_argument("-o", "--output", required=True, help="STL file to write.")
+    subparsers.add_parser("list", help="List the stored meshes and their sizes.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Run the requested command, returning the exit code.
+    """
+    args = parse_args(argv)
+    store = ArtifactStore(args.store_dir)
+    if args.command == "add":
+        for path in args.stls:
+            digest, new = store.add(path, args.quantum)
+            stored = os.path.getsize(store.path_for(digest))
+            note = f"{stored/1024:.0f} KB" if new else "already stored"
+            print(f"{digest}  {path} ({os.path.getsize(path)/1024:.0f} KB -> {note})")
+    elif args.command == "get":
+        try:
+            digest = store.resolve(args.digest)
+        except KeyError as err:
+            print(err.args[0], file=sys.stderr)
+            return 1
+        store.get(digest, args.output)
+    else:
+        total = 0
+        for digest in store.digests():
+            size = os.path.getsize(store.path_for(digest))
+            total += size
+            print(f"{digest}  {size/1024:.0f} KB")
+        print(f"{total/1024**2:.1f} MB stored", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+#! /usr/bin/env python3
+'''
+Render many designs to STL in parallel.
+
+Each render is a separate OpenSCAD process and CGAL renders are single
+threaded, so the renders are spread over a pool of workers (one per CPU by
+default). Renders are started longest first, using the time each took last
+time, so that a slow render doesn't start last and hold up the whole build.
+Designs that have never been rendered are started first as they may be slow.
+
+    python tools/build_stls.py 3Nuts SpringJaws SimpleLever
+    python tools/build_stls.py 3Nuts/fibreholderMk5.0-BFA.scad --timeout 600 -o build/stl
+
+Folders are searched for designs, i.e. scad files that no other file uses
+or includes. STLs are written to the output folder (build/stl by default)
+mirroring the paths of the designs, and go through the render cache unless
+--no-cache is given. Designs that choose their part with `part` (see
+export_parts.py) are rendered as one STL per part.
+'''
+
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from openscad_cli import render, scad_value
+from render_cache import RenderCache, DEFAULT_CACHE_DIR
+from scad_deps import DependencyIndex, REPO_DIR, strip_comments
+
+DEFAULT_OUTPUT_DIR = os.path.join(REPO_DIR, "build", "stl")
+DEFAULT_TIMES = os.path.join(os.path.dirname(DEFAULT_CACHE_DIR), "render_times.json")
+# The part shown when no part is chosen, this is not exported
+ASSEMBLY_PART = "assembly"
+_PART_CHECK = re.compile(r"\bpart\s*==\s*\"([^\"]+)\"")
+
+
+def job_key(job):
+    """
+    A string identifying a render, the design and its overrides.
+    """
+    scad = os.path.relpath(os.path.abspath(job["scad"]), REPO_DIR).replace(os.sep, "/")
+    defines = job.get("defines") or {}
+    overrides = ",".join(f"{name}={scad_value(defines[name])}" for name in sorted(defines))
+    return f"{scad}[{overrides}]" if overrides else scad
+
+
+class RenderTimes:
+    """
+    The time each render took the last time it was run, kept in a JSON file
+    and used to start the longest renders first.
+    """
+    def __init__(self, path=DEFAULT_TIMES):
+        self.path = path
+        self.times = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r') as file_obj:
+                self.times = json.load(file_obj)
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+    def estimate(self, job):
+        """
+        The expected render time of a job, infinite if it has never been rendered.
+        """
+        return self.times.get(job_key(job), float("inf"))
+
+    def record(self, job, seconds):
+        """
+        Record how long a render took.
+        """
+        with self._lock:
+            self.times[job_key(job)] = seconds
+
+    def save(self):
+        """
+        Write the times to disk.
+        """
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock:
+            with open(self.path, 'w') as file_obj:
+                json.dump(self.times, file_obj, indent=1, sort_keys=True)
+
+def longest_first(jobs, times):
+    """
+    Return the indices of the jobs, ordered so the ones expected to take longest
+    are first. Ties keep their order.
+    """
+    return sorted(range(len(jobs)), key=lambda index: -times.estimate(jobs[index]))
+
+def run_jobs(jobs, workers=None, timeout=None, cache=None, times=None, on_result=None):
+    """
+    Render every job, a dictionary with "scad", "output" and optionally
+    "defines", on a pool of `workers`. Renders use `cache` if given, and
+    `times` is used to order the jobs and is updated with the new times.
+    `on_result` is called with each job and its result as soon as it finishes.
+    Returns a list of (job, result) in the order the jobs were given.
+    """
+    workers = workers or os.cpu_count() or 1
+    times = times if times is not None else RenderTimes()
+
+    def run_one(job):
+        os.makedirs(os.path.dirname(os.path.abspath(job["output"])), exist_ok=True)
+        if cache is not None:
+            return cache.render(job["scad"], job["output"], job.get("defines"), timeout)
+        result = render(job["scad"], job["output"], job.get("defines"), timeout)
+        result["cached"] = False
+        return result
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # The pool starts jobs in the order they are submitted
+        futures = {executor.submit(run_one, jobs[index]): index for index in longest_first(jobs, times)}
+        for future in as_completed(futures):
+            index = futures[future]
+            job = jobs[index]
+            try:
+                result = future.result()
+            except OSError as err:
+                result = {"returncode": None, "timed_out": False, "wall_time": 0.0,
+                          "cached": False, "log": str(err)}
+            if result["returncode"] == 0 and not result["cached"]:
+                times.record(job, result["wall_time"])
+            results[index] = result
+            if on_result is not None:
+                on_result(job, result)
+    times.save()
+    return [(job, results[index]) for index, job in enumerate(jobs)]
+
+def find_designs(paths):
+    """
+    Return the designs (scad files nothing else depends on) in `paths`, which
+    can be folders or scad files. Paths are absolute and sorted.
+    """
+    index = DependencyIndex()
+    index.update()
+    dependents = index.dependents()
+    designs = [rel for rel in index.files if rel not in dependents]
+    found = set()
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isfile(path):
+            found.add(path)
+            continue
+        for rel in designs:
+            absolute = os.path.join(REPO_DIR, rel)
+            if os.path.commonpath([absolute, path]) == path:
+                found.add(os.path.normpath(absolute))
+    return sorted(found)
+
+def find_parts(scad_path):
+    """
+    The parts a design can render, found from its `part=="name"` checks, in
+    the order they first appear. The assembly is not included.
+    """
+    with open(scad_path, 'r', encoding='utf-8', errors='replace') as file_obj:
+        source = strip_comments(file_obj.read())
+    parts = []
+    for name in _PART_CHECK.findall(source):
+        if name != ASSEMBLY_PART and name not in parts:
+            parts.append(name)
+    return parts
+
+def design_jobs(designs, output_dir):
+    """
+    A job rendering each design to an STL in `output_dir` with the same path
+    relative to output_dir as the design has to the top of the repository.
+    Designs with parts have a job for each part, written to a folder named
+    after the design.
+    """
+    jobs = []
+    for scad in designs:
+        rel = os.path.relpath(scad, REPO_DIR)
+        stem = os.path.join(output_dir, os.path.splitext(rel)[0])
+        parts = find_parts(scad)
+        if not parts:
+            jobs.append({"scad": scad, "output": stem + ".stl", "defines": {}})
+        for part in parts:
+            jobs.append({
+                "scad": scad,
+                "output": os.path.join(stem, part + ".stl"),
+                "defines": {"part": part},
+            })
+    return jobs
+
+def print_summary(results, file=sys.stdout):
+    """
+    Print the render times, slowest first, followed by any failures.
+    Returns the number of failures.
+    """
+    failures = []
+    for job, result in sorted(results, key=lambda item: -item[1]["wall_time"]):
+        name = job_key(job)
+        if result["returncode"] != 0:
+            failures.append((name, result))
+            continue
+        source = "cached" if result["cached"] else f"{result['wall_time']:8.1f}s"
+        print(f"{source:>9}  {name}", file=file)
+    for name, result in failures:
+        reason = "timed out" if result["timed_out"] else "failed"
+        print(f"\n{name} {reason}:", file=file)
+        # The end of the log is where OpenSCAD reports the error
+        print("\n".join((result.get("log") or "").strip().splitlines()[-10:]), file=file)
+    total = sum(result["wall_time"] for _, result in results)
+    print(
+        f"\n{len(results) - len(failures)} rendered, {len(failures)} failed, "
+        f"{total:.1f}s of rendering",
+        file=file
+    )
+    return len(failures)
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Render designs to STL in parallel.")
+    parser.add_argument("paths", nargs="+", help="Folders or scad files to render.")
+    parser.add_argument("-o", "--output-dir", default=DEFAULT_OUTPUT_DIR, help="Folder for the STLs.")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Renders to run at once.")
+    parser.add_argument("--timeout", type=float, default=None, help="Timeout per render in seconds.")
+    parser.add_argument("--no-cache", action="store_true", help="Always render, don't use the cache.")
+    parser.add_argument("--json", default=None, help="Also write the results to this JSON file.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Render the designs, returning 1 if any failed.
+    """
+    args = parse_args(argv)
+    jobs = design_jobs(find_designs(args.paths), args.output_dir)
+    cache = None if args.no_cache else RenderCache()
+
+    def progress(job, result):
+        status = "ok" if result["returncode"] == 0 else "FAILED"
+        print(f"[{status}] {job_key(job)}", file=sys.stderr)
+
+    results = run_jobs(jobs, args.workers, args.timeout, cache, on_result=progress)
+    failures = print_summary(results)
+    if args.json is not None:
+        with open(args.json, 'w') as file_obj:
+            json.dump(
+                [
+                    {
+                        "job": job,
+                        "returncode": result["returncode"],
+                        "timed_out": result["timed_out"],
+                        "cached": result["cached"],
+                        "wall_time": result["wall_time"],
+                    }
+                    for job, result in results
+                ],
+                file_obj,
+                indent=2
+            )
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
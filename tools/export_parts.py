@@ -0,0 +1,70 @@
+#! /usr/bin/env python3
+'''
+Export every part of a design to its own STL.
+
+Designs choose what to render with a `part` variable, which is "assembly"
+unless set with -D, and a check for each printable part:
+
+    part = "assembly";
+    if (part=="assembly"){ ... }
+    if (part=="gearFrame") gearFrame();
+    if (part=="bandPost") bandPost();
+
+This finds every part in a design and renders them at the same time, one
+OpenSCAD process each, into a folder named after the design:
+
+    python tools/export_parts.py "3Nuts/fibreholderMk3.5.1-OutsideGears+2Bands.scad"
+    python tools/export_parts.py "3Nuts/fibreholderMk3.5.1-OutsideGears+2Bands.scad" --parts gearFrame bandPost
+
+Renders go through the render cache, so parts that have not changed since they
+were last exported are copied from the cache rather than rendered again.
+'''
+
+import argparse
+import os
+import sys
+
+from build_stls import DEFAULT_OUTPUT_DIR, design_jobs, find_parts, print_summary, run_jobs
+from render_cache import RenderCache
+
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Export every part of a design to STL.")
+    parser.add_argument("designs", nargs="+", help="scad files to export.")
+    parser.add_argument("--parts", nargs="+", default=None, help="Only export these parts.")
+    parser.add_argument("--list", action="store_true", help="List the parts rather than export them.")
+    parser.add_argument("-o", "--output-dir", default=DEFAULT_OUTPUT_DIR, help="Folder for the STLs.")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Renders to run at once.")
+    parser.add_argument("--timeout", type=float, default=None, help="Timeout per render in seconds.")
+    parser.add_argument("--no-cache", action="store_true", help="Always render, don't use the cache.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Export the parts, returning 1 if any failed.
+    """
+    args = parse_args(argv)
+    designs = [os.path.abspath(design) for design in args.designs]
+    if args.list:
+        for design in designs:
+            print(f"{design}: {', '.join(find_parts(design)) or 'no parts'}")
+        return 0
+    jobs = [
+        job for job in design_jobs(designs, args.output_dir)
+        if args.parts is None or job["defines"].get("part") in args.parts
+    ]
+    if not jobs:
+        print("No parts to export.", file=sys.stderr)
+        return 1
+    cache = None if args.no_cache else RenderCache()
+    results = run_jobs(jobs, args.workers, args.timeout, cache)
+    for job, result in results:
+        if result["returncode"] == 0:
+            print(job["output"], file=sys.stderr)
+    return 1 if print_summary(results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
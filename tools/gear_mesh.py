@@ -0,0 +1,321 @@
+#! /usr/bin/env python3
+'''
+Check that pairs of ourGear gears mesh, without rendering or animating them.
+
+ourGear turns each gear by 360*$t/numTeeth (backwards with _reverse), so over
+$t from 0 to 1 every gear moves on by one tooth and a meshing pair goes
+through every position it can be in. For each pair of gears this takes the
+outlines gear_profiles.py works out (the same shapes ourGear draws), places
+them the centre distance apart with a tooth of one in a gap of the other at
+$t=0, and at each step of a dense sweep of $t works out:
+
+* interference: how far the boundary of either gear is inside the other, and
+* backlash: how far the second gear can turn either way, with the first held
+  still, before a tooth touches, as a distance along its pitch circle.
+
+Every step is worked out for every boundary point at once with NumPy, taking
+a few hundredths of a second a pair, so a grid of a hundred pairs takes
+seconds.
+
+    python tools/gear_mesh.py --teeth 21 --mate-teeth 13 --gear-tol 0 0.1 0.2 0.3
+    python tools/gear_mesh.py --teeth 21 --mate-teeth 13 --gear-tol -0.2 0.2 \\
+        --pressure-angle 20 25 30 --clearance 0.2 0.5 -o mesh.csv
+
+The centre distance is the sum of the pitch radii plus gearTol, as in the 3Nuts
+designs, or is given outright with --centre-distance. Results are printed, or
+written as CSV, or as one JSON object per line if the output file ends in
+.json or .jsonl. A pair with a gear whose teeth come to a point is reported
+as an error and the rest of the grid is still checked. Returns 1 if any pair
+interferes or can't be made.
+'''
+
+import argparse
+import csv
+import itertools
+import json
+import sys
+
+import numpy as np
+
+from gear_profiles import (DEFAULT_CLEARANCE, DEFAULT_FACETS, DEFAULT_PRESSURE_ANGLE,
+                           DEFAULT_SPACING, gear_dimensions, gear_outline)
+
+DEFAULT_STEPS = 360
+# Spacing of the points along the gear boundaries, in mm
+DEFAULT_POINT_SPACING = 0.05
+# Overlaps smaller than this, in mm, are rounding rather than interference
+INTERFERENCE_TOLERANCE = 1e-6
+RESULT_FIELDS = [
+    "teeth", "mate_teeth", "spacing", "pressure_angle", "clearance", "backlash",
+    "centre_distance", "gear_tol", "interference", "min_backlash", "max_backlash", "ok", "error"
+]
+
+
+class GearShape:
+    """
+    A gear outline in a form that can be looked up quickly: the radius of the
+    outline in any direction, and the half width of a tooth at any radius.
+    """
+    def __init__(self, teeth, spacing, pressure_angle, clearance, backlash, facets=DEFAULT_FACETS):
+        self.teeth = teeth
+        self.dims = gear_dimensions(teeth, spacing, pressure_angle, clearance, backlash)
+        self.outline = gear_outline(teeth, spacing, pressure_angle, clearance, backlash, facets)
+        # The outline turns steadily anticlockwise, so its angles only ever
+        # increase (the feet of the teeth are radial, rounding aside)
+        angles = np.maximum.accumulate(np.unwrap(np.arctan2(self.outline[:, 1], self.outline[:, 0])))
+        self._angles = np.append(angles, angles[0] + 2*np.pi)
+        # Each edge as the cross product of its ends and the vector along it
+        start = self.outline
+        along = np.roll(start, -1, axis=0) - start
+        self._cross = start[:, 0]*along[:, 1] - start[:, 1]*along[:, 0]
+        self._along = along
+        # Half width of a tooth against radius, up the clockwise flank of the
+        # first tooth (from its foot if it has one) to its tip
+        tooth = self.outline[:len(self.outline)//teeth]
+        flank = tooth[:np.argmax(np.hypot(*tooth.T)) + 1]
+        self._flank_radii = np.hypot(*flank.T)
+        self._flank_angles = -np.arctan2(flank[:, 1], flank[:, 0])
+
+    def radius(self, angles):
+        """
+        The distance from the centre to the outline in directions `angles`
+        (radians, any shape).
+        """
+        angles = self._angles[0] + np.mod(angles - self._angles[0], 2*np.pi)
+        edge = np.clip(np.searchsorted(self._angles, angles, side="right") - 1, 0, len(self.outline) - 1)
+        # Where the ray from the centre crosses the edge
+        along = self._along[edge]
+        return self._cross[edge]/(np.cos(angles)*along[..., 1] - np.sin(angles)*along[..., 0])
+
+    def half_width(self, radii):
+        """
+        The angle (radians) from the middle of a tooth to its flank at `radii`.
+        Below the flanks the gear is solid (half the tooth pitch), and above
+        the tips it is empty (-inf).
+        """
+        widths = np.interp(radii, self._flank_radii, self._flank_angles, right=-np.inf)
+        return np.where(radii < self._flank_radii[0], np.pi/self.teeth, widths)
+
+    def boundary(self, spacing=DEFAULT_POINT_SPACING):
+        """
+        Points along the whole outline no more than `spacing` apart.
+        """
+        start = self.outline
+        along = np.roll(start, -1, axis=0) - start
+        counts = np.maximum(1, np.ceil(np.hypot(*along.T)/spacing).astype(int))
+        edge = np.repeat(np.arange(len(start)), counts)
+        fraction = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return start[edge] + (fraction/counts[edge])[:, None]*along[edge]
+
+
+def to_frame(points, angles, centre, frame_angles, reach):
+    """
+    Polar coordinates, in the frame of a gear at `centre` turned by
+    `frame_angles`, of points on a gear at the origin turned by `angles`,
+    keeping only those closer than `reach` to `centre`. `points` is (n, 2) and
+    the angles are (m,). Returns the step (index into the angles), radius
+    and angle of each point kept.
+    """
+    cos, sin = np.cos(angles)[:, None], np.sin(angles)[:, None]
+    x = cos*points[None, :, 0] - sin*points[None, :, 1] - centre[0]
+    y = sin*points[None, :, 0] + cos*points[None, :, 1] - centre[1]
+    close = x*x + y*y < reach*reach
+    steps = np.nonzero(close)[0]
+    x, y = x[close], y[close]
+    return steps, np.hypot(x, y), np.arctan2(y, x) - frame_angles[steps]
+
+def facing(points, angles, centre_distance, mate_outer_radius, direction=0.0):
+    """
+    The points of a gear, turned by any of `angles` (radians), that can be
+    inside the outer circle of a mate `centre_distance` away in `direction`.
+    """
+    radii = np.hypot(*points.T)
+    # Furthest a point can be from the line of centres and still reach the mate
+    reach = np.arcsin(min(1.0, mate_outer_radius/centre_distance))
+    middle = (angles.max() + angles.min())/2
+    sweep = (angles.max() - angles.min())/2
+    offset = np.arctan2(points[:, 1], points[:, 0]) + middle - direction
+    offset = np.abs(np.mod(offset + np.pi, 2*np.pi) - np.pi)
+    return points[(radii > centre_distance - mate_outer_radius) & (offset <= reach + sweep)]
+
+def check_pair(gear, mate, centre_distance, steps=DEFAULT_STEPS, point_spacing=DEFAULT_POINT_SPACING,
+               mate_phase=0):
+    """
+    Sweep $t over one tooth for `gear` at the origin and `mate` (a GearShape
+    each) at (centre_distance, 0), turned the other way. `mate_phase` turns
+    the mate further, in degrees. Returns the greatest interference and the
+    least and greatest backlash (in mm along the mate's pitch circle).
+    """
+    t = np.arange(steps)/steps
+    gear_angles = 2*np.pi*t/gear.teeth
+    # A gap of the mate faces the first tooth of the gear at $t=0
+    mate_angles = np.pi + np.pi/mate.teeth + np.radians(mate_phase) - 2*np.pi*t/mate.teeth
+    centre = np.array([centre_distance, 0.0])
+    # Only points that can reach into the other gear
+    gear_points = facing(gear.boundary(point_spacing), gear_angles, centre_distance, mate.dims["outer_radius"])
+    mate_points = facing(mate.boundary(point_spacing), mate_angles, centre_distance,
+                         gear.dims["outer_radius"], np.pi)
+
+    # The gear's boundary in the mate's frame, and the mate's in the gear's,
+    # where they are close enough to touch
+    steps_in, radii, angles = to_frame(gear_points, gear_angles, centre, mate_angles, mate.dims["outer_radius"])
+    _, mate_radii, mate_angles_in = to_frame(mate_points, mate_angles, -centre, gear_angles,
+                                             gear.dims["outer_radius"])
+    depth = max(
+        (mate.radius(angles) - radii).max(initial=0),
+        (gear.radius(mate_angles_in) - mate_radii).max(initial=0)
+    )
+
+    # How far the mate can turn each way before its teeth reach each point of the gear
+    pitch = 2*np.pi/mate.teeth
+    position = np.mod(angles, pitch)
+    width = mate.half_width(radii)
+    forward = np.full(steps, np.inf)
+    backward = np.full(steps, np.inf)
+    np.minimum.at(forward, steps_in, np.where(position >= width, position - width, 0))
+    np.minimum.at(backward, steps_in, np.where(pitch - position >= width, pitch - width - position, 0))
+    backlash = (forward + backward)*mate.dims["pitch_radius"]
+    return {
+        "interference": float(depth),
+        "min_backlash": float(backlash.min()),
+        "max_backlash": float(backlash.max()),
+    }
+
+def check_grid(grid, steps=DEFAULT_STEPS, point_spacing=DEFAULT_POINT_SPACING, mate_phase=0):
+    """
+    Check every combination of the lists of values in `grid`, which has keys
+    teeth, mate_teeth, spacing, pressure_angle, clearance, backlash and one of
+    gear_tol or centre_distance. Yields a row of results for each. Gears that
+    can't be made (teeth that come to a point) give a row with the error
+    rather than stopping the sweep.
+    """
+    names = list(grid)
+    shapes = {}
+    for values in itertools.product(*(grid[name] for name in names)):
+        params = dict(zip(names, values))
+        shape_params = [params[name] for name in ["spacing", "pressure_angle", "clearance", "backlash"]]
+        pair = []
+        for teeth in [params["teeth"], params["mate_teeth"]]:
+            key = (teeth, *shape_params)
+            if key not in shapes:
+                try:
+                    shapes[key] = GearShape(*key)
+                except ValueError as err:
+                    shapes[key] = f"{teeth} teeth: {err}"
+            pair.append(shapes[key])
+        pitch_sum = sum(gear_dimensions(teeth, *shape_params)["pitch_radius"]
+                        for teeth in [params["teeth"], params["mate_teeth"]])
+        if "centre_distance" in params:
+            params["gear_tol"] = params["centre_distance"] - pitch_sum
+        else:
+            params["centre_distance"] = pitch_sum + params["gear_tol"]
+        errors = [shape for shape in pair if isinstance(shape, str)]
+        if errors:
+            row = dict(params, interference=None, min_backlash=None, max_backlash=None, ok=False,
+                       error="; ".join(errors))
+        else:
+            result = check_pair(pair[0], pair[1], params["centre_distance"], steps, point_spacing, mate_phase)
+            row = dict(params, **result)
+            row["ok"] = row["interference"] <= INTERFERENCE_TOLERANCE
+            row["error"] = None
+        yield row
+
+def print_row(row, file=sys.stderr):
+    """
+    Print a line of results for one pair.
+    """
+    pair = (
+        f"{row['teeth']}/{row['mate_teeth']} teeth, "
+        f"pressure angle {row['pressure_angle']:g}, clearance {row['clearance']:g}, "
+        f"gearTol {row['gear_tol']:.3f}"
+    )
+    if row["error"] is not None:
+        print(f"[FAILED] {pair}: {row['error']}", file=file)
+        return
+    status = "ok" if row["ok"] else "INTERFERES"
+    print(
+        f"[{status}] {pair}: interference {row['interference']:.4f} mm, "
+        f"backlash {row['min_backlash']:.4f}-{row['max_backlash']:.4f} mm",
+        file=file
+    )
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Check gear pairs mesh over a sweep of $t.")
+    parser.add_argument("--teeth", type=int, nargs="+", required=True, help="Teeth on the first gear.")
+    parser.add_argument("--mate-teeth", type=int, nargs="+", required=True, help="Teeth on the second gear.")
+    distance = parser.add_mutually_exclusive_group()
+    distance.add_argument(
+        "--gear-tol",
+        type=float,
+        nargs="+",
+        default=[0.0],
+        help="Centre distance beyond the sum of the pitch radii, in mm."
+    )
+    distance.add_argument("--centre-distance", type=float, nargs="+", help="Centre distance in mm.")
+    parser.add_argument("--spacing", type=float, nargs="+", default=[DEFAULT_SPACING], help="toothArcSpacing in mm.")
+    parser.add_argument(
+        "--pressure-angle",
+        type=float,
+        nargs="+",
+        default=[DEFAULT_PRESSURE_ANGLE],
+        help="In degrees."
+    )
+    parser.add_argument("--clearance", type=float, nargs="+", default=[DEFAULT_CLEARANCE], help="In mm.")
+    parser.add_argument("--backlash", type=float, nargs="+", default=[0.0], help="backlash_ in mm.")
+    parser.add_argument("--steps", type=int, default=DEFAULT_STEPS, help="Steps of $t over one tooth.")
+    parser.add_argument(
+        "--point-spacing",
+        type=float,
+        default=DEFAULT_POINT_SPACING,
+        help="Spacing of the points checked along the outlines, in mm."
+    )
+    parser.add_argument(
+        "--mate-phase",
+        type=float,
+        default=0,
+        help="Degrees the second gear is turned from having a gap facing a tooth of the first."
+    )
+    parser.add_argument("-o", "--output", default=None, help="CSV or JSON lines file to write.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Check the grid of gear pairs, returning 1 if any interfere or can't be made.
+    """
+    args = parse_args(argv)
+    grid = {
+        "teeth": args.teeth,
+        "mate_teeth": args.mate_teeth,
+        "spacing": args.spacing,
+        "pressure_angle": args.pressure_angle,
+        "clearance": args.clearance,
+        "backlash": args.backlash,
+    }
+    if args.centre_distance is not None:
+        grid["centre_distance"] = args.centre_distance
+    else:
+        grid["gear_tol"] = args.gear_tol
+    file_obj = sys.stdout if args.output is None else open(args.output, 'w', newline='')
+    json_lines = args.output is not None and args.output.endswith((".json", ".jsonl"))
+    writer = None if json_lines else csv.DictWriter(file_obj, fieldnames=RESULT_FIELDS)
+    if writer is not None:
+        writer.writeheader()
+    failed = 0
+    try:
+        for row in check_grid(grid, args.steps, args.point_spacing, args.mate_phase):
+            failed += not row["ok"]
+            print_row(row)
+            if json_lines:
+                file_obj.write(json.dumps(row) + "\n")
+            else:
+                writer.writerow(row)
+    finally:
+        if file_obj is not sys.stdout:
+            file_obj.close()
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
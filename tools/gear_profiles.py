@@ -0,0 +1,274 @@
+#! /usr/bin/env python3
+'''
+Work out the outlines of involute gears once, rather than in every render.
+
+ourGear in UsefullBits/gearbox.scad draws its gears with MCAD gear(), which
+builds each outline from a root polygon and a fan of small polygons per tooth,
+all unioned, every time a design is rendered. This works out the same outline
+with NumPy, for the same tooth spacing, pressure angle, clearance and backlash
+and the same number of facets along each involute, and writes the outlines to
+UsefullBits/gear_profiles.scad. ourGear uses an outline from there when there
+is one for its parameters, and falls back to gear() when there isn't.
+
+    python tools/gear_profiles.py
+    python tools/gear_profiles.py --teeth 21 13 --spacing 5 --pressure-angle 30 \\
+        --clearance 0.5 --check
+
+By default an outline is written for every tooth count ourGear is used with in
+the 3Nuts designs, with the parameters set in gearbox.scad. --check compares
+each outline with the union MCAD makes.
+'''
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from scad_deps import REPO_DIR
+
+DEFAULT_OUTPUT = os.path.join(REPO_DIR, "UsefullBits", "gear_profiles.scad")
+# Tooth counts ourGear is used with in the 3Nuts designs
+DEFAULT_TEETH = [8, 12, 13, 17, 18, 21, 22, 23, 24, 36, 40, 50]
+# As set in gearbox.scad
+DEFAULT_SPACING = 5
+DEFAULT_PRESSURE_ANGLE = 30
+DEFAULT_CLEARANCE = 0.5
+DEFAULT_BACKLASH = 0
+# MCAD uses $fn/4 facets along each involute, and gearbox.scad sets $fn=100
+DEFAULT_FACETS = 25
+
+
+def gear_dimensions(teeth, spacing, pressure_angle, clearance=0, backlash=0):
+    """
+    The radii and angles (in degrees) MCAD gear() works out for a gear with
+    `teeth` teeth `spacing` mm apart along the pitch circle.
+    """
+    # gearbox.scad passes diametral_pitch=PI/toothArcSpacing, which MCAD
+    # turns into a circular pitch of 180/diametral_pitch
+    circular_pitch = 180*spacing/np.pi
+    pitch_radius = teeth*circular_pitch/360
+    addendum = 2*pitch_radius/teeth
+    backlash_angle = np.degrees(backlash/pitch_radius)
+    return {
+        "pitch_radius": pitch_radius,
+        "base_radius": pitch_radius*np.cos(np.radians(pressure_angle)),
+        "outer_radius": pitch_radius + addendum,
+        "root_radius": pitch_radius - addendum - clearance,
+        "half_thick_angle": (360/teeth - backlash_angle)/4,
+    }
+
+def involute(base_radius, angles):
+    """
+    Points on the involute of a circle of `base_radius` for an array of
+    involute angles in degrees, as an (n, 2) array.
+    """
+    radians = np.radians(angles)
+    return base_radius*np.stack([
+        np.cos(radians) + radians*np.sin(radians),
+        np.sin(radians) - radians*np.cos(radians),
+    ], axis=-1)
+
+def involute_angle(base_radius, radius):
+    """
+    The involute angle in degrees at which the involute reaches `radius`.
+    """
+    return np.degrees(np.sqrt((radius/base_radius)**2 - 1))
+
+def unit_vectors(angles):
+    """
+    (n, 2) unit vectors in the directions `angles`, in degrees.
+    """
+    radians = np.radians(np.asarray(angles, dtype=np.float64))
+    return np.stack([np.cos(radians), np.sin(radians)], axis=-1)
+
+def rotate(points, angle):
+    """
+    Rotate (n, 2) points anticlockwise about the origin by `angle` degrees.
+    """
+    cos, sin = np.cos(np.radians(angle)), np.sin(np.radians(angle))
+    return points @ np.array([[cos, sin], [-sin, cos]])
+
+def tooth_flank(dims, facets=DEFAULT_FACETS):
+    """
+    The clockwise flank of the tooth centred on the x axis, from the base (or
+    root) circle to the outer circle, as MCAD involute_gear_tooth makes it.
+    The anticlockwise flank is its mirror image in the x axis.
+    """
+    base_radius = dims["base_radius"]
+    pitch_point = involute(base_radius, involute_angle(base_radius, dims["pitch_radius"]))
+    centre_angle = np.degrees(np.arctan2(pitch_point[1], pitch_point[0])) + dims["half_thick_angle"]
+    start = involute_angle(base_radius, max(base_radius, dims["root_radius"]))
+    stop = involute_angle(base_radius, dims["outer_radius"])
+    flank = rotate(involute(base_radius, start + (stop - start)*np.arange(facets + 1)/facets), -centre_angle)
+    if np.any(flank[:, 1] >= 0):
+        raise ValueError("The teeth come to a point inside the outer circle")
+    return flank
+
+def root_polygon_radius(dims, teeth, angles):
+    """
+    The distance from the centre to the edge of MCAD's root polygon (a circle
+    with $fn=2*teeth, turned by half_thick_angle) in directions `angles`.
+    """
+    sector = 180/teeth
+    offset = np.mod(np.asarray(angles) - dims["half_thick_angle"], sector) - sector/2
+    return dims["root_radius"]*np.cos(np.radians(sector/2))/np.cos(np.radians(offset))
+
+def gear_outline(teeth, spacing=DEFAULT_SPACING, pressure_angle=DEFAULT_PRESSURE_ANGLE,
+                 clearance=DEFAULT_CLEARANCE, backlash=DEFAULT_BACKLASH, facets=DEFAULT_FACETS):
+    """
+    The outline of MCAD gear_shape as an (n, 2) anticlockwise polygon, with
+    the first tooth centred on the x axis.
+    """
+    dims = gear_dimensions(teeth, spacing, pressure_angle, clearance, backlash)
+    flank = tooth_flank(dims, facets)
+    # Below the involute the flanks run straight towards the centre, until they
+    # meet the root polygon. This is only symmetric about the tooth with no backlash.
+    start_angle = np.degrees(np.arctan2(flank[0, 1], flank[0, 0]))
+    start_radius = np.hypot(*flank[0])
+    feet = root_polygon_radius(dims, teeth, [start_angle, -start_angle])
+    mirrored = flank[::-1]*[1, -1]
+    if feet[0] < start_radius - 1e-9:
+        flank = np.concatenate([feet[0]*unit_vectors([start_angle]), flank])
+    if feet[1] < start_radius - 1e-9:
+        mirrored = np.concatenate([mirrored, feet[1]*unit_vectors([-start_angle])])
+    # Root polygon corners in the gap between this tooth and the next
+    sector = 180/teeth
+    first = np.ceil((-start_angle - dims["half_thick_angle"])/sector + 1e-9)
+    last = np.floor((360/teeth + start_angle - dims["half_thick_angle"])/sector - 1e-9)
+    corner_angles = dims["half_thick_angle"] + sector*np.arange(first, last + 1)
+    corners = dims["root_radius"]*unit_vectors(corner_angles)
+    tooth = np.concatenate([flank, mirrored, corners])
+    return np.concatenate([rotate(tooth, i*360/teeth) for i in range(teeth)])
+
+def mcad_pieces(teeth, spacing=DEFAULT_SPACING, pressure_angle=DEFAULT_PRESSURE_ANGLE,
+                clearance=DEFAULT_CLEARANCE, backlash=DEFAULT_BACKLASH, facets=DEFAULT_FACETS):
+    """
+    The polygons MCAD gear_shape unions, point for point: the root polygon and
+    `facets` fan polygons for each tooth.
+    """
+    dims = gear_dimensions(teeth, spacing, pressure_angle, clearance, backlash)
+    flank = tooth_flank(dims, facets)
+    root_angles = dims["half_thick_angle"] + np.arange(2*teeth)*180/teeth
+    pieces = [dims["root_radius"]*unit_vectors(root_angles)]
+    for i in range(1, teeth + 1):
+        for j in range(facets):
+            fan = [[0, 0], flank[j], flank[j + 1], flank[j + 1]*[1, -1], flank[j]*[1, -1]]
+            pieces.append(rotate(np.array(fan), i*360/teeth))
+    return pieces
+
+def inside(polygon, points):
+    """
+    Whether each of (m, 2) points is inside an (n, 2) polygon (even-odd rule).
+    """
+    points = np.asarray(points, dtype=np.float64)
+    start = polygon[:, None, :]
+    end = np.roll(polygon, -1, axis=0)[:, None, :]
+    x, y = points[None, :, 0], points[None, :, 1]
+    crosses = (start[..., 1] > y) != (end[..., 1] > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_cross = start[..., 0] + (y - start[..., 1])*(end[..., 0] - start[..., 0])/(end[..., 1] - start[..., 1])
+    return np.count_nonzero(crosses & (x < x_cross), axis=0) % 2 == 1
+
+def boundary_distance(polygon, points):
+    """
+    The distance from each of (m, 2) points to the edges of an (n, 2) polygon.
+    """
+    start = polygon[:, None, :]
+    edge = np.roll(polygon, -1, axis=0)[:, None, :] - start
+    offset = np.asarray(points, dtype=np.float64)[None, :, :] - start
+    t = np.clip((offset*edge).sum(axis=-1)/np.maximum((edge*edge).sum(axis=-1), 1e-300), 0, 1)
+    return np.linalg.norm(offset - t[..., None]*edge, axis=-1).min(axis=0)
+
+def compare_with_mcad(outline, pieces, samples=20000, seed=0):
+    """
+    Compare an outline with the union of MCAD's pieces at random points in
+    and around the gear. Returns the greatest distance from the outline's
+    edge of a point that is inside one but not the other (0 if they agree
+    everywhere sampled).
+    """
+    reach = np.abs(outline).max()*1.05
+    points = np.random.default_rng(seed).uniform(-reach, reach, (samples, 2))
+    in_outline = inside(outline, points)
+    in_mcad = np.zeros(len(points), dtype=bool)
+    for piece in pieces:
+        in_mcad |= inside(piece, points)
+    differ = in_outline != in_mcad
+    if not differ.any():
+        return 0.0
+    return float(boundary_distance(outline, points[differ]).max())
+
+def profile_key(teeth, spacing, pressure_angle, clearance, backlash, facets):
+    """
+    The parameters an outline is looked up by in gearbox.scad.
+    """
+    return [teeth, spacing, pressure_angle, clearance, backlash, facets]
+
+def scad_number(value):
+    """
+    A number written so OpenSCAD reads back the same double.
+    """
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+def profiles_scad(profiles, digits=6):
+    """
+    The text of the scad data file for a list of (key, outline) pairs. Points
+    are written to `digits` decimal places.
+    """
+    lines = [
+        "// Involute gear outlines for ourGear in gearbox.scad, written by",
+        "// tools/gear_profiles.py. Do not edit, run that again instead.",
+        "// [[numTeeth, toothArcSpacing, pressureAngle, clearance_, backlash_, involute facets], points]",
+        "gearProfiles = [",
+    ]
+    for index, (key, outline) in enumerate(profiles):
+        points = ",".join(f"[{x:.{digits}f},{y:.{digits}f}]" for x, y in outline)
+        separator = "," if index < len(profiles) - 1 else ""
+        lines.append(f"    [[{','.join(scad_number(value) for value in key)}], [{points}]]{separator}")
+    lines.append("];")
+    return "\n".join(lines) + "\n"
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Write involute gear outlines for ourGear.")
+    parser.add_argument("--teeth", type=int, nargs="+", default=DEFAULT_TEETH, help="Tooth counts.")
+    parser.add_argument("--spacing", type=float, default=DEFAULT_SPACING, help="toothArcSpacing in mm.")
+    parser.add_argument("--pressure-angle", type=float, default=DEFAULT_PRESSURE_ANGLE, help="In degrees.")
+    parser.add_argument("--clearance", type=float, default=DEFAULT_CLEARANCE, help="In mm.")
+    parser.add_argument("--backlash", type=float, default=DEFAULT_BACKLASH, help="In mm.")
+    parser.add_argument("--facets", type=int, default=DEFAULT_FACETS, help="Facets along each involute ($fn/4).")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help="scad file to write.")
+    parser.add_argument("--check", action="store_true", help="Compare each outline with MCAD's union.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Write the outlines, returning 1 if any can't be made or differ from MCAD's
+    when checked. Gears that can't be made are left out, so ourGear draws them
+    with gear().
+    """
+    args = parse_args(argv)
+    profiles = []
+    failures = 0
+    for teeth in args.teeth:
+        params = (teeth, args.spacing, args.pressure_angle, args.clearance, args.backlash, args.facets)
+        try:
+            outline = gear_outline(*params)
+        except ValueError as err:
+            print(f"{teeth} teeth: {err}, not cached", file=sys.stderr)
+            failures += 1
+            continue
+        profiles.append((profile_key(*params), outline))
+        if args.check:
+            error = compare_with_mcad(outline, mcad_pieces(*params))
+            failures += error > 1e-5
+            print(f"{teeth} teeth: {len(outline)} points, differs from MCAD by {error:.2g} mm", file=sys.stderr)
+    with open(args.output, 'w') as file_obj:
+        file_obj.write(profiles_scad(profiles))
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+#! /usr/bin/env python3
+'''
+Check that STL meshes are watertight 2-manifolds before they are printed.
+
+STL stores each triangle with its own copy of its vertices, so the vertices
+are first welded: coordinates are rounded to the weld tolerance and each
+distinct point is given an index. Every edge of a closed, manifold mesh is
+then shared by exactly two triangles which use it in opposite directions.
+Each STL is checked for:
+
+* open edges, used by only one triangle (holes in the surface),
+* non-manifold edges, used by more than two triangles,
+* inconsistent edges, used twice in the same direction (flipped triangles),
+* degenerate triangles, with two vertices the same or no area, and
+* duplicate triangles, with the same three vertices as another.
+
+    python tools/mesh_check.py 3Nuts/STLs/3.5/interGearBrimmed.stl
+    python tools/mesh_check.py --json mesh_check.json
+
+With no paths every STL in the repository is checked, spread over a pool of
+processes. Returns 1 if any mesh has problems.
+'''
+
+import argparse
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from stl_mesh import REPO_DIR, find_stls, load_triangles
+
+DEFAULT_WELD_TOLERANCE = 1e-5
+PROBLEMS = ["open_edges", "non_manifold_edges", "inconsistent_edges", "degenerate_faces", "duplicate_faces"]
+
+
+def weld_vertices(triangles, tolerance=DEFAULT_WELD_TOLERANCE):
+    """
+    Merge the vertices of an (n, 3, 3) array of triangles that round to the same
+    multiple of `tolerance`. Returns the (m, 3) welded points and an (n, 3)
+    array of indices into them.
+    """
+    triangles = np.asarray(triangles, dtype=np.float64)
+    keys = np.ascontiguousarray(np.round(triangles.reshape(-1, 3)/tolerance).astype(np.int64))
+    # Each rounded point as a single 24 byte key, so equal points hash and compare as one value
+    packed = keys.view(np.dtype((np.void, keys.dtype.itemsize*3))).ravel()
+    _, first, inverse = np.unique(packed, return_index=True, return_inverse=True)
+    points = triangles.reshape(-1, 3)[first]
+    return points, inverse.reshape(-1, 3)
+
+def edge_table(faces, vertex_count):
+    """
+    Every edge of some faces (an (n, 3) array of vertex indices), returned as
+    the unique undirected edges as integer keys, how many faces use each, and
+    how many use each directed edge more than once.
+    """
+    start = faces.reshape(-1)
+    end = faces[:, [1, 2, 0]].reshape(-1)
+    undirected = np.minimum(start, end)*vertex_count + np.maximum(start, end)
+    edges, counts = np.unique(undirected, return_counts=True)
+    _, directed_counts = np.unique(start*vertex_count + end, return_counts=True)
+    return edges, counts, int(np.count_nonzero(directed_counts > 1))
+
+def check_mesh(triangles, tolerance=DEFAULT_WELD_TOLERANCE):
+    """
+    Check an (n, 3, 3) array of triangles. Returns a dictionary with the number
+    of triangles and welded vertices, the number of each kind of problem, and
+    whether the mesh is "watertight" (closed, manifold and consistently wound).
+    """
+    points, faces = weld_vertices(triangles, tolerance)
+    a, b, c = points[faces[:, 0]], points[faces[:, 1]], points[faces[:, 2]]
+    areas = 0.5*np.linalg.norm(np.cross(b - a, c - a), axis=1)
+    collapsed = (faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2]) | (faces[:, 2] == faces[:, 0])
+    degenerate = collapsed | (areas <= 0.5*tolerance**2)
+    _, duplicate_counts = np.unique(np.sort(faces[~collapsed], axis=1), axis=0, return_counts=True)
+    # Collapsed triangles have no real edges, zero area ones still join their neighbours
+    _, counts, inconsistent = edge_table(faces[~collapsed], len(points))
+    report = {
+        "triangles": int(len(faces)),
+        "vertices": int(len(points)),
+        "open_edges": int(np.count_nonzero(counts == 1)),
+        "non_manifold_edges": int(np.count_nonzero(counts > 2)),
+        "inconsistent_edges": inconsistent,
+        "degenerate_faces": int(np.count_nonzero(degenerate)),
+        "duplicate_faces": int((duplicate_counts - 1).sum()),
+    }
+    report["watertight"] = len(faces) > 0 and not (
+        report["open_edges"] or report["non_manifold_edges"] or report["inconsistent_edges"]
+    )
+    return report
+
+def check_stl(path, tolerance=DEFAULT_WELD_TOLERANCE):
+    """
+    Check the mesh in an STL file. Returns the report with "path" and "ok"
+    added, or "path" and "error" if the file can't be read.
+    """
+    try:
+        report = check_mesh(load_triangles(path), tolerance)
+    except (OSError, ValueError) as err:
+        return {"path": path, "ok": False, "error": str(err)}
+    report["ok"] = report["watertight"] and not any(report[name] for name in PROBLEMS)
+    return dict(report, path=path)
+
+def _check_stl_args(args):
+    """
+    check_stl taking a tuple, for ProcessPoolExecutor.map
+    """
+    return check_stl(*args)
+
+def check_all(paths, tolerance=DEFAULT_WELD_TOLERANCE, workers=None):
+    """
+    Check every STL in `paths` on a pool of `workers` processes. Returns the
+    reports in path order.
+    """
+    stls = find_stls(paths)
+    if workers == 1 or len(stls) < 2:
+        return [check_stl(path, tolerance) for path in stls]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_check_stl_args, [(path, tolerance) for path in stls], chunksize=4))
+
+def print_reports(reports, file=sys.stdout):
+    """
+    Print a line for each mesh checked. Returns the number with problems.
+    """
+    failures = 0
+    for report in reports:
+        failures += not report["ok"]
+        if "error" in report:
+            print(f"[FAIL] {report['path']}: {report['error']}", file=file)
+            continue
+        problems = [f"{report[name]} {name.replace('_', ' ')}" for name in PROBLEMS if report[name]]
+        if not report["triangles"]:
+            problems.append("no triangles")
+        detail = ", ".join(problems) if problems else f"{report['triangles']} triangles"
+        print(f"[{'ok' if report['ok'] else 'FAIL'}] {report['path']}: {detail}", file=file)
+    return failures
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Check STL meshes are watertight and manifold.")
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        default=[REPO_DIR],
+        help="STL files or folders to search, defaults to the whole repository."
+    )
+    parser.add_argument(
+        "--weld-tolerance",
+        type=float,
+        default=DEFAULT_WELD_TOLERANCE,
+        help="Vertices closer than this, in mm, are the same vertex."
+    )
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Processes to use.")
+    parser.add_argument("--json", default=None, help="Write the reports to this JSON file.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Check the STLs, returning 1 if any have problems.
+    """
+    args = parse_args(argv)
+    reports = check_all(args.paths, args.weld_tolerance, args.workers)
+    failures = print_reports(reports)
+    if args.json is not None:
+        with open(args.json, 'w') as file_obj:
+            json.dump(reports, file_obj, indent=2)
+    print(f"\n{len(reports) - failures} ok, {failures} with problems", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,394 @@
+#! /usr/bin/env python3
+'''
+Check that the committed STLs still match what their designs render.
+
+The STLs to check, and the design and overrides each is rendered from, are
+listed in stl_targets.json. Each design is rendered (through the render cache,
+in parallel) and the new mesh is compared with the committed one:
+
+1. The bounding boxes are compared. Every point of one mesh must be within
+   the Hausdorff distance of the other, so if a corner of the bounding box
+   has moved by more than the tolerance the meshes differ.
+2. If the bounding box, volume and surface area all match the meshes are
+   taken to be the same.
+3. Otherwise points are sampled over both surfaces, the distance from each
+   to the other surface is measured and the largest is the Hausdorff
+   distance. The meshes match if it is within the tolerance, e.g. if the
+   triangles have only been split differently.
+
+    python tools/mesh_regress.py
+    python tools/mesh_regress.py 3Nuts/STLs/5.0/fibreholderMk5.0-BFA.stl --tolerance 0.05
+    git diff --name-only main | xargs python tools/mesh_regress.py --changed
+
+With --changed only the STLs whose designs are affected by the changed files
+are checked. Returns 1 if any STL no longer matches.
+'''
+
+import argparse
+import itertools
+import json
+import os
+import sys
+from tempfile import mkdtemp
+import shutil
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from build_stls import run_jobs
+from render_cache import RenderCache
+from scad_deps import DependencyIndex, REPO_DIR
+from stl_mesh import load_triangles, mesh_metrics
+
+DEFAULT_TARGETS = os.path.join(REPO_DIR, "tools", "stl_targets.json")
+DEFAULT_TOLERANCE = 0.01
+DEFAULT_REL_TOLERANCE = 1e-4
+DEFAULT_SAMPLES = 50000
+
+
+def load_targets(path=DEFAULT_TARGETS):
+    """
+    The STLs to check, a dictionary of the STL path (relative to the top of the
+    repository) to a dictionary with the "scad" file and its "defines".
+    """
+    with open(path, 'r') as file_obj:
+        return json.load(file_obj)
+
+def sample_surface(triangles, count, rng):
+    """
+    `count` points spread uniformly over the surface of a mesh, plus its vertices.
+    """
+    triangles = np.asarray(triangles, dtype=np.float64)
+    a, b, c = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    areas = 0.5*np.linalg.norm(np.cross(b - a, c - a), axis=1)
+    total = areas.sum()
+    # Each vertex is shared by several triangles, it only needs sampling once
+    vertices = np.unique(triangles.reshape(-1, 3), axis=0)
+    if total == 0 or count == 0:
+        return vertices
+    chosen = rng.choice(len(triangles), size=count, p=areas/total)
+    # Uniform barycentric coordinates, folding points outside the triangle back in
+    u, v = rng.random(count), rng.random(count)
+    outside = u + v > 1
+    u[outside], v[outside] = 1 - u[outside], 1 - v[outside]
+    points = a[chosen] + u[:, None]*(b[chosen] - a[chosen]) + v[:, None]*(c[chosen] - a[chosen])
+    return np.concatenate([points, vertices])
+
+def subdivide(triangles, max_edge):
+    """
+    Split triangles in two across their longest edge until no edge is longer
+    than `max_edge`. The surface and the winding are unchanged.
+    """
+    pieces = np.asarray(triangles, dtype=np.float64)
+    while True:
+        lengths = np.linalg.norm(pieces[:, [1, 2, 0]] - pieces, axis=2)
+        longest = lengths.argmax(axis=1)
+        split = lengths[np.arange(len(pieces)), longest] > max_edge
+        if not split.any():
+            return pieces
+        # Rotate the corners so the longest edge is from corner 0 to corner 1
+        order = (longest[split, None] + np.arange(3)) % 3
+        rotated = np.take_along_axis(pieces[split], order[:, :, None], axis=1)
+        v0, v1, v2 = rotated[:, 0], rotated[:, 1], rotated[:, 2]
+        middle = (v0 + v1)/2
+        pieces = np.concatenate([
+            pieces[~split],
+            np.stack([v0, middle, v2], axis=1),
+            np.stack([middle, v1, v2], axis=1),
+        ])
+
+def point_triangle_distance(points, a, b, c):
+    """
+    The distance from each point to the matching triangle (a, b, c), all
+    (n, 3) arrays. This finds the closest point on each triangle by which
+    of its corners, edges or face is nearest, as in Ericson's Real-Time
+    Collision Detection.
+    """
+    ab, ac = b - a, c - a
+    ap, bp, cp = points - a, points - b, points - c
+    dot = lambda x, y: np.einsum("ij,ij->i", x, y)
+    d1, d2 = dot(ab, ap), dot(ac, ap)
+    d3, d4 = dot(ab, bp), dot(ac, bp)
+    d5, d6 = dot(ab, cp), dot(ac, cp)
+    va, vb, vc = d3*d6 - d5*d4, d5*d2 - d1*d6, d1*d4 - d3*d2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denom = va + vb + vc
+        closest = a + ab*(vb/denom)[:, None] + ac*(vc/denom)[:, None]
+        # Later regions take priority, as they are checked first by Ericson
+        regions = [
+            ((va <= 0) & (d4 - d3 >= 0) & (d5 - d6 >= 0),
+             b + (c - b)*((d4 - d3)/((d4 - d3) + (d5 - d6)))[:, None]),
+            ((vb <= 0) & (d2 >= 0) & (d6 <= 0), a + ac*(d2/(d2 - d6))[:, None]),
+            ((d6 >= 0) & (d5 <= d6), c),
+            ((vc <= 0) & (d1 >= 0) & (d3 <= 0), a + ab*(d1/(d1 - d3))[:, None]),
+            ((d3 >= 0) & (d4 <= d3), b),
+            ((d1 <= 0) & (d2 <= 0), a),
+        ]
+        for inside, point in regions:
+            closest = np.where(inside[:, None], point, closest)
+    distances = np.linalg.norm(points - closest, axis=1)
+    # Degenerate triangles can give nan, they are also covered by their neighbours
+    return np.where(np.isnan(distances), np.inf, distances)
+
+def _cell_keys(cells):
+    """
+    One int64 key for each row of an (n, 3) array of integer grid cells.
+    """
+    cells = cells - cells.min(axis=0)
+    shape = cells.max(axis=0) + 1
+    return (cells[:, 0]*shape[1] + cells[:, 1])*shape[2] + cells[:, 2]
+
+def surface_distances(points, triangles, reach, cell, chunk=1 << 21):
+    """
+    The distance from each point to the surface of a mesh. Distances up to
+    `reach` are exact, larger ones are measured to a nearby triangle so are
+    never underestimated.
+
+    The triangles are split into pieces no bigger than a grid `cell`, and
+    each piece is listed in every cell it comes within `reach` of. A point is
+    then measured to every piece listed in its own cell.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    pieces = subdivide(triangles, cell)
+    # The piece with the nearest centroid gives an upper bound for every point
+    _, nearest = cKDTree(pieces.mean(axis=1)).query(points)
+    distances = point_triangle_distance(points, pieces[nearest, 0], pieces[nearest, 1], pieces[nearest, 2])
+
+    origin = points.min(axis=0)
+    low = np.floor((pieces.min(axis=1) - reach - origin)/cell).astype(np.int64)
+    high = np.floor((pieces.max(axis=1) + reach - origin)/cell).astype(np.int64)
+    listed_cells, listed_pieces = [], []
+    for offset in itertools.product(range(int((high - low).max()) + 1), repeat=3):
+        cells = low + offset
+        inside = np.all(cells <= high, axis=1)
+        listed_cells.append(cells[inside])
+        listed_pieces.append(np.flatnonzero(inside))
+    point_cells = np.floor((points - origin)/cell).astype(np.int64)
+    keys = _cell_keys(np.concatenate(listed_cells + [point_cells]))
+    piece_keys, point_keys = keys[:-len(points)], keys[-len(points):]
+    order = np.argsort(piece_keys, kind="stable")
+    piece_keys = piece_keys[order]
+    listed_pieces = np.concatenate(listed_pieces)[order]
+    starts = np.searchsorted(piece_keys, point_keys, side="left")
+    counts = np.searchsorted(piece_keys, point_keys, side="right") - starts
+
+    # Measure in chunks of about `chunk` point and piece pairs to limit memory.
+    # Only pieces whose bounding box is nearer than the best distance so far
+    # are measured exactly.
+    piece_low, piece_high = pieces.min(axis=1), pieces.max(axis=1)
+    first = 0
+    totals = np.cumsum(counts)
+    while first < len(points):
+        last = max(int(np.searchsorted(totals, totals[first] - counts[first] + chunk)), first + 1)
+        count = counts[first:last]
+        if count.sum():
+            point_index = np.repeat(np.arange(first, last), count)
+            within = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+            piece_index = listed_pieces[np.repeat(starts[first:last], count) + within]
+            near = points[point_index]
+            gap = np.maximum(np.maximum(piece_low[piece_index] - near, near - piece_high[piece_index]), 0)
+            keep = np.einsum("ij,ij->i", gap, gap) < distances[point_index]**2
+            point_index, piece_index = point_index[keep], piece_index[keep]
+            candidates = pieces[piece_index]
+            measured = point_triangle_distance(
+                points[point_index], candidates[:, 0], candidates[:, 1], candidates[:, 2]
+            )
+            np.minimum.at(distances, point_index, measured)
+        first = last
+    return distances
+
+def sampled_hausdorff(triangles_a, triangles_b, samples=DEFAULT_SAMPLES, reach=DEFAULT_TOLERANCE, seed=0):
+    """
+    The Hausdorff distance between two meshes, estimated from points sampled
+    over each surface (and their vertices). The distance from each point to
+    the other surface is exact up to `reach` and overestimated beyond it, so
+    the estimate is only low if the furthest point of a surface was not
+    sampled.
+    """
+    if not len(triangles_a) or not len(triangles_b):
+        return 0.0 if len(triangles_a) == len(triangles_b) else float("inf")
+    rng = np.random.default_rng(seed)
+    points_a = sample_surface(triangles_a, samples, rng)
+    points_b = sample_surface(triangles_b, samples, rng)
+    # Cells a few times the gap between samples balance the number of pieces
+    # against the number of pieces in each cell
+    area = max(mesh_metrics(triangles_a)["area"], mesh_metrics(triangles_b)["area"])
+    cell = max(2*reach, 4*np.sqrt(area/samples))
+    a_to_b = surface_distances(points_a, triangles_b, reach, cell)
+    b_to_a = surface_distances(points_b, triangles_a, reach, cell)
+    return float(max(a_to_b.max(), b_to_a.max()))
+
+def relative_change(old, new):
+    """
+    The change from old to new relative to the size of old.
+    """
+    if old == new:
+        return 0.0
+    return abs(new - old)/max(abs(old), 1e-12)
+
+def compare_meshes(
+    reference,
+    candidate,
+    tolerance=DEFAULT_TOLERANCE,
+    rel_tolerance=DEFAULT_REL_TOLERANCE,
+    samples=DEFAULT_SAMPLES
+):
+    """
+    Compare two meshes given as (n, 3, 3) arrays of triangles. Returns a
+    dictionary with "ok", the "stage" that decided ("invariants", "bbox" or
+    "hausdorff"), the changes in volume, area and bounding box, and the
+    Hausdorff distance if it was needed.
+    """
+    old = mesh_metrics(reference)
+    new = mesh_metrics(candidate)
+    comparison = {
+        "volume_change": relative_change(old["volume"], new["volume"]),
+        "area_change": relative_change(old["area"], new["area"]),
+        "bbox_change": None,
+        "hausdorff": None,
+    }
+    if old["bbox_min"] is None or new["bbox_min"] is None:
+        same = old["bbox_min"] is None and new["bbox_min"] is None
+        return dict(comparison, ok=same, stage="bbox")
+    bbox_change = float(max(
+        np.abs(np.subtract(old["bbox_min"], new["bbox_min"])).max(),
+        np.abs(np.subtract(old["bbox_max"], new["bbox_max"])).max(),
+    ))
+    comparison["bbox_change"] = bbox_change
+    if bbox_change > tolerance:
+        return dict(comparison, ok=False, stage="bbox")
+    if comparison["volume_change"] <= rel_tolerance and comparison["area_change"] <= rel_tolerance:
+        return dict(comparison, ok=True, stage="invariants")
+    distance = sampled_hausdorff(reference, candidate, samples, tolerance)
+    comparison["hausdorff"] = distance
+    return dict(comparison, ok=distance <= tolerance, stage="hausdorff")
+
+def changed_targets(targets, changed_paths):
+    """
+    The STLs in `targets` whose design is affected by any of `changed_paths`.
+    A changed STL is checked too.
+    """
+    index = DependencyIndex()
+    index.update()
+    affected = set(index.affected(changed_paths, targets_only=False))
+    changed = {os.path.relpath(os.path.abspath(path), REPO_DIR).replace(os.sep, "/") for path in changed_paths}
+    return [
+        stl for stl, target in targets.items()
+        if target["scad"] in affected or stl in changed
+    ]
+
+def check_targets(stls, targets, tolerance, rel_tolerance, samples, workers=None, timeout=None, cache=None):
+    """
+    Render the designs for `stls` and compare each with the committed STL.
+    Returns a list of results, one for each STL.
+    """
+    out_dir = mkdtemp(prefix="mesh_regress_")
+    try:
+        jobs = [
+            {
+                "scad": os.path.join(REPO_DIR, targets[stl]["scad"]),
+                "output": os.path.join(out_dir, f"{i}.stl"),
+                "defines": targets[stl].get("defines", {}),
+            }
+            for i, stl in enumerate(stls)
+        ]
+        results = []
+        for stl, (job, render_result) in zip(stls, run_jobs(jobs, workers, timeout, cache)):
+            result = {"stl": stl, "scad": targets[stl]["scad"], "defines": job["defines"],
+                      "render_time": render_result["wall_time"], "cached": render_result["cached"]}
+            if render_result["returncode"] != 0 or not os.path.exists(job["output"]):
+                results.append(dict(result, ok=False, stage="render", log=render_result.get("log")))
+                continue
+            comparison = compare_meshes(
+                load_triangles(os.path.join(REPO_DIR, stl)),
+                load_triangles(job["output"]),
+                tolerance,
+                rel_tolerance,
+                samples
+            )
+            results.append(dict(result, **comparison))
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return results
+
+def print_results(results, file=sys.stdout):
+    """
+    Print a line for each STL checked. Returns the number that failed.
+    """
+    failures = 0
+    for result in results:
+        status = "pass" if result["ok"] else "FAIL"
+        failures += not result["ok"]
+        if result["stage"] == "render":
+            detail = "render failed"
+        else:
+            detail = f"volume {result['volume_change']:.2e}, area {result['area_change']:.2e}"
+            if result["bbox_change"] is not None:
+                detail = f"bbox {result['bbox_change']:.4f}, " + detail
+            if result["hausdorff"] is not None:
+                detail += f", hausdorff {result['hausdorff']:.4f}"
+        print(f"[{status}] {result['stl']} ({result['stage']}: {detail})", file=file)
+    return failures
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Compare fresh renders with the committed STLs.")
+    parser.add_argument("stls", nargs="*", help="STLs to check, defaults to all of them.")
+    parser.add_argument(
+        "--changed",
+        action="store_true",
+        help="Treat the paths as changed files and check the STLs they affect."
+    )
+    parser.add_argument("--targets", default=DEFAULT_TARGETS, help="JSON file listing the STLs.")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="Largest distance in mm a surface may move."
+    )
+    parser.add_argument(
+        "--rel-tolerance",
+        type=float,
+        default=DEFAULT_REL_TOLERANCE,
+        help="Relative change in volume and area allowed without sampling the surfaces."
+    )
+    parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES, help="Points per surface.")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Renders to run at once.")
+    parser.add_argument("--timeout", type=float, default=None, help="Timeout per render in seconds.")
+    parser.add_argument("--no-cache", action="store_true", help="Always render, don't use the cache.")
+    parser.add_argument("--json", default=None, help="Also write the results to this JSON file.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Check the STLs, returning 1 if any no longer match.
+    """
+    args = parse_args(argv)
+    targets = load_targets(args.targets)
+    if args.changed:
+        stls = changed_targets(targets, args.stls)
+    elif args.stls:
+        stls = [os.path.relpath(os.path.abspath(path), REPO_DIR).replace(os.sep, "/") for path in args.stls]
+        unknown = [stl for stl in stls if stl not in targets]
+        if unknown:
+            print(f"Not listed in {args.targets}: {', '.join(unknown)}", file=sys.stderr)
+            return 1
+    else:
+        stls = sorted(targets)
+    if not stls:
+        print("No STLs to check.", file=sys.stderr)
+        return 0
+    cache = None if args.no_cache else RenderCache()
+    results = check_targets(
+        stls, targets, args.tolerance, args.rel_tolerance, args.samples, args.workers, args.timeout, cache
+    )
+    failures = print_results(results)
+    if args.json is not None:
+        with open(args.json, 'w') as file_obj:
+            json.dump(results, file_obj, indent=2)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+'''
+Helpers for running OpenSCAD from the build and benchmark tools.
+
+The OpenSCAD executable is "openscad" on the path unless the OPENSCAD
+environment variable is set.
+'''
+
+import os
+import re
+import subprocess
+import threading
+import time
+
+OPENSCAD = os.environ.get("OPENSCAD", "openscad")
+
+# Lines OpenSCAD prints about the render, mapped to the name they are stored as.
+_STAT_PATTERNS = [
+    ("csg_elements", re.compile(r"Normalized (?:CSG )?tree has (\d+) elements")),
+    ("geometries_in_cache", re.compile(r"Geometries in cache: (\d+)")),
+    ("geometry_cache_bytes", re.compile(r"Geometry cache size in bytes: (\d+)")),
+    ("cgal_polyhedrons_in_cache", re.compile(r"CGAL Polyhedrons in cache: (\d+)")),
+    ("cgal_cache_bytes", re.compile(r"CGAL cache size in bytes: (\d+)")),
+    ("vertices", re.compile(r"^\s*Vertices:\s*(\d+)", re.MULTILINE)),
+    ("facets", re.compile(r"^\s*Facets:\s*(\d+)", re.MULTILINE)),
+    ("volumes", re.compile(r"^\s*Volumes:\s*(\d+)", re.MULTILINE)),
+]
+# Newer versions print "0:00:01.234", older ones "0 hours, 0 minutes, 1 seconds"
+_TIME_PATTERNS = [
+    re.compile(r"(?P<label>[A-Za-z ]+time): (?P<h>\d+):(?P<m>\d+):(?P<s>[\d.]+)"),
+    re.compile(
+        r"(?P<label>[A-Za-z ]+time): (?P<h>\d+) hours?, (?P<m>\d+) minutes?, (?P<s>[\d.]+) seconds?"
+    ),
+]
+
+
+def openscad_version():
+    """
+    Return the OpenSCAD version string, OpenSCAD prints this to stderr.
+    """
+    result = subprocess.run(
+        [OPENSCAD, "--version"],
+        check=False,
+        capture_output=True,
+        text=True
+    )
+    return (result.stderr or result.stdout).strip()
+
+def scad_value(value):
+    """
+    Format a python value as an OpenSCAD literal for use with -D.
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, str):
+        return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(scad_value(item) for item in value) + "]"
+    if value is None:
+        return "undef"
+    return repr(value)
+
+def define_args(defines):
+    """
+    Turn a dictionary of variable overrides into OpenSCAD -D arguments.
+    The arguments are sorted so the same overrides always give the same command.
+    """
+    if not defines:
+        return []
+    args = []
+    for name in sorted(defines):
+        args += ["-D", f"{name}={scad_value(defines[name])}"]
+    return args
+
+def parse_render_stats(log):
+    """
+    Pull the timings and geometry statistics that OpenSCAD prints out of its
+    log. Timings are in seconds and are keyed by their label, e.g.
+    "total rendering time".
+    """
+    stats = {}
+    for name, pattern in _STAT_PATTERNS:
+        matches = pattern.findall(log)
+        if matches:
+            # The last one is for the top level object
+            stats[name] = int(matches[-1])
+    timings = {}
+    for pattern in _TIME_PATTERNS:
+        for match in pattern.finditer(log):
+            label = match.group("label").strip().lower()
+            seconds = (
+                int(match.group("h"))*3600 + int(match.group("m"))*60 + float(match.group("s"))
+            )
+            timings[label] = seconds
+    stats["timings"] = timings
+    return stats
+
+def _wait_with_usage(process, timeout):
+    """
+    Wait for a process, returning its exit code and resource usage. The usage
+    is None on platforms without os.wait4. The process is killed if it runs
+    longer than `timeout` seconds.
+    """
+    timer = None
+    timed_out = []
+    if timeout is not None:
+        def kill():
+            timed_out.append(True)
+            process.kill()
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+    try:
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(process.pid, 0)
+            # Let Popen know the process has gone
+            process.returncode = os.waitstatus_to_exitcode(status)
+        else:
+            process.wait()
+            usage = None
+    finally:
+        if timer is not None:
+            timer.cancel()
+    return process.returncode, usage, bool(timed_out)
+
+def render(scad_path, output_path, defines=None, timeout=None, extra_args=None):
+    """
+    Render a scad file to `output_path` (the format is set by the extension).
+    Returns a dictionary with the exit code, wall time, CPU time and peak memory
+    of the OpenSCAD process, the log it printed and the statistics parsed from it.
+    """
+    command = [OPENSCAD, "-o", output_path] + define_args(defines)
+    command += list(extra_args or []) + [scad_path]
+    start_time = time.perf_counter()
+    with subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True
+    ) as process:
+        # Read the log on a thread so that a full pipe can't block OpenSCAD
+        log_parts = []
+        reader = threading.Thread(target=lambda: log_parts.append(process.stdout.read()))
+        reader.start()
+        returncode, usage, timed_out = _wait_with_usage(process, timeout)
+        reader.join()
+    wall_time = time.perf_counter() - start_time
+    log = "".join(log_parts)
+    result = {
+        "scad": scad_path,
+        "output": output_path,
+        "defines": dict(defines or {}),
+        "command": command,
+        "returncode": returncode,
+        "timed_out": timed_out,
+        "wall_time": wall_time,
+        "cpu_time": None,
+        "peak_rss_kb": None,
+        "log": log,
+        "stats": parse_render_stats(log),
+    }
+    if usage is not None:
+        result["cpu_time"] = usage.ru_utime + usage.ru_stime
+        # ru_maxrss is in kilobytes on Linux but bytes on macOS
+        result["peak_rss_kb"] = usage.ru_maxrss // 1024 if os.uname().sysname == "Darwin" else usage.ru_maxrss
+    return result
+
+def count_stl_facets(path):
+    """
+    Count the triangles in a binary or ASCII STL file without loading it.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as file_obj:
+        header = file_obj.read(84)
+        if len(header) == 84:
+            count = int.from_bytes(header[80:84], "little")
+            # A binary STL is exactly 50 bytes per triangle after the header
+            if size == 84 + 50*count:
+                return count
+        file_obj.seek(0)
+        return sum(line.lstrip().startswith(b"facet") for line in file_obj)
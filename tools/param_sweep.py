@@ -0,0 +1,280 @@
+#! /usr/bin/env python3
+'''
+Render a design for many values of its parameters.
+
+Each variant of the design is a set of -D overrides, taken either from every
+combination of some lists of values (a grid), or picked at random from ranges.
+The variants are rendered in parallel through the render cache, and a row is
+written for each one as soon as it finishes, with the overrides, the STL, how
+long it took to render, the number of facets and the volume of the part.
+
+    python tools/param_sweep.py "3Nuts/fibreholderMk3.5.1-OutsideGears+2Bands.scad" \\
+        --grid gearTol=0.1,0.2,0.3 numTeeth=17,21 -D part=gearFrame -o sweep.csv
+    python tools/param_sweep.py 3Nuts/fibreholderMk3.4-Elastic.scad \\
+        --random 20 --range cubeSize=14:18 doveDepth=1.5:2.5 --seed 1 -o sweep.jsonl
+
+Results are written as CSV, or as one JSON object per line if the output file
+ends in .json or .jsonl. STLs are written to build/sweep/<design>/ unless
+--stl-dir is given.
+'''
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+
+from build_stls import job_key, run_jobs
+from openscad_cli import scad_value
+from render_cache import RenderCache, parse_define
+from scad_deps import REPO_DIR
+from stl_mesh import load_triangles, mesh_metrics
+
+DEFAULT_STL_DIR = os.path.join(REPO_DIR, "build", "sweep")
+RESULT_FIELDS = ["variant", "overrides", "stl", "ok", "cached", "wall_time", "cpu_time", "facets", "volume"]
+
+
+def parse_values(text):
+    """
+    Parse "name=v1,v2,v3" into a name and a list of values, each read as JSON
+    if possible and otherwise used as a string.
+    """
+    name, sep, values = text.partition("=")
+    if not sep or not name.strip() or not values:
+        raise argparse.ArgumentTypeError(f"Grid values must be of the form name=v1,v2,..., not {text!r}")
+    return name.strip(), [parse_define(f"{name}={value}")[1] for value in values.split(",")]
+
+def parse_range(text):
+    """
+    Parse "name=low:high" into a name and the two limits. If both limits are
+    integers the values sampled are integers.
+    """
+    name, sep, limits = text.partition("=")
+    low, colon, high = limits.partition(":")
+    if not sep or not colon or not name.strip():
+        raise argparse.ArgumentTypeError(f"Ranges must be of the form name=low:high, not {text!r}")
+    try:
+        low, high = json.loads(low), json.loads(high)
+    except json.JSONDecodeError:
+        low = high = None
+    numbers = [isinstance(limit, (int, float)) and not isinstance(limit, bool) for limit in (low, high)]
+    if not all(numbers):
+        raise argparse.ArgumentTypeError(f"The limits of a range must be numbers, not {limits!r}")
+    if low > high:
+        raise argparse.ArgumentTypeError(f"The range for {name} is empty")
+    return name.strip(), (low, high)
+
+def grid_variants(grid, fixed=None):
+    """
+    Every combination of the values in `grid`, a dictionary of name to a list
+    of values. Each variant also has the `fixed` overrides.
+    """
+    names = list(grid)
+    return [
+        dict(fixed or {}, **dict(zip(names, values)))
+        for values in itertools.product(*(grid[name] for name in names))
+    ]
+
+def random_variants(count, ranges, choices=None, fixed=None, seed=None):
+    """
+    `count` variants with each value in `ranges` (name to (low, high)) drawn
+    uniformly and each in `choices` (name to a list of values) picked at random.
+    Values are rounded to 4 decimal places so that they can be given to OpenSCAD
+    exactly.
+    """
+    rng = random.Random(seed)
+    variants = []
+    for _ in range(count):
+        variant = dict(fixed or {})
+        for name, (low, high) in ranges.items():
+            if isinstance(low, int) and isinstance(high, int):
+                variant[name] = rng.randint(low, high)
+            else:
+                variant[name] = round(rng.uniform(low, high), 4)
+        for name, values in (choices or {}).items():
+            variant[name] = rng.choice(values)
+        variants.append(variant)
+    return variants
+
+def variant_name(overrides):
+    """
+    A file name for a variant made from its overrides, e.g. "gearTol=0.2,numTeeth=21".
+    """
+    name = ",".join(f"{key}={scad_value(overrides[key])}" for key in sorted(overrides))
+    return "".join(char if char.isalnum() or char in "=,.-_" else "_" for char in name) or "default"
+
+def sweep_jobs(scad_path, variants, stl_dir):
+    """
+    A render job for each variant, writing its STL to `stl_dir`. Repeated
+    variants are only rendered once. Different variants can have the same
+    name once it is made safe for a file name (e.g. x="a b" and x="a_b"), so
+    the later ones have their index in the variants added to the name.
+    """
+    jobs = []
+    seen = set()
+    names = set()
+    for index, overrides in enumerate(variants):
+        key = tuple(sorted((name, scad_value(value)) for name, value in overrides.items()))
+        if key in seen:
+            continue
+        seen.add(key)
+        name = variant_name(overrides)
+        if name in names:
+            name = f"{name}-{index}"
+        names.add(name)
+        jobs.append({
+            "scad": scad_path,
+            "output": os.path.join(stl_dir, name + ".stl"),
+            "defines": overrides,
+        })
+    return jobs
+
+def measure(job, result):
+    """
+    The row of results for a finished render.
+    """
+    ok = result["returncode"] == 0 and os.path.exists(job["output"])
+    metrics = mesh_metrics(load_triangles(job["output"])) if ok else None
+    return {
+        "variant": job_key(job),
+        "overrides": job["defines"],
+        "stl": job["output"],
+        "ok": ok,
+        "cached": result["cached"],
+        "wall_time": result["wall_time"],
+        "cpu_time": result.get("cpu_time"),
+        "facets": metrics["triangles"] if ok else None,
+        "volume": metrics["volume"] if ok else None,
+    }
+
+
+class ResultWriter:
+    """
+    Writes a row for each variant as it finishes, as CSV or JSON lines.
+    Rows are flushed straight away so a long sweep can be watched, and a sweep
+    that is stopped part way keeps the results it has.
+    """
+    def __init__(self, file_obj, json_lines=False):
+        self.file_obj = file_obj
+        self.json_lines = json_lines
+        self._lock = threading.Lock()
+        self._csv = None
+        if not json_lines:
+            self._csv = csv.DictWriter(file_obj, fieldnames=RESULT_FIELDS)
+            self._csv.writeheader()
+
+    def write(self, row):
+        """
+        Write one row of results.
+        """
+        with self._lock:
+            if self.json_lines:
+                self.file_obj.write(json.dumps(row) + "\n")
+            else:
+                self._csv.writerow(dict(row, overrides=json.dumps(row["overrides"], sort_keys=True)))
+            self.file_obj.flush()
+
+
+def run_sweep(scad_path, variants, stl_dir, writer=None, workers=None, timeout=None, cache=None):
+    """
+    Render every variant of `scad_path`, passing each row of results to
+    `writer` as it finishes. Returns the rows in the order of the variants.
+    """
+    jobs = sweep_jobs(scad_path, variants, stl_dir)
+    rows = {}
+
+    def on_result(job, result):
+        row = measure(job, result)
+        rows[job["output"]] = row
+        if writer is not None:
+            writer.write(row)
+        status = "ok" if row["ok"] else "FAILED"
+        print(f"[{status}] {row['variant']}", file=sys.stderr)
+
+    run_jobs(jobs, workers, timeout, cache, on_result=on_result)
+    return [rows[job["output"]] for job in jobs]
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Render a design for many parameter values.")
+    parser.add_argument("design", help="scad file to render.")
+    parser.add_argument(
+        "--grid",
+        nargs="+",
+        type=parse_values,
+        default=[],
+        help="Values to try, name=v1,v2,..."
+    )
+    parser.add_argument(
+        "--random",
+        type=int,
+        default=None,
+        help="Render this many random variants rather than the whole grid."
+    )
+    parser.add_argument(
+        "--range",
+        nargs="+",
+        type=parse_range,
+        default=[],
+        help="Ranges to sample, name=low:high"
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the random variants.")
+    parser.add_argument(
+        "-D",
+        dest="defines",
+        action="append",
+        default=[],
+        help="Override a variable in every variant, name=value. Can be repeated."
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=None,
+        help="File for the results (.csv, or .json/.jsonl for JSON lines), defaults to stdout as CSV."
+    )
+    parser.add_argument("--stl-dir", default=None, help="Folder for the STLs.")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Renders to run at once.")
+    parser.add_argument("--timeout", type=float, default=None, help="Timeout per render in seconds.")
+    parser.add_argument("--no-cache", action="store_true", help="Always render, don't use the cache.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Run the sweep, returning 1 if any variant failed to render.
+    """
+    args = parse_args(argv)
+    fixed = dict(parse_define(text) for text in args.defines)
+    grid = dict(args.grid)
+    if args.random is not None:
+        ranges = dict(args.range)
+        # Grid values are picked from at random when sampling
+        variants = random_variants(args.random, ranges, grid, fixed, args.seed)
+    else:
+        if args.range:
+            print("--range needs --random", file=sys.stderr)
+            return 1
+        variants = grid_variants(grid, fixed)
+    scad_path = os.path.abspath(args.design)
+    stem = os.path.splitext(os.path.relpath(scad_path, REPO_DIR))[0]
+    stl_dir = args.stl_dir or os.path.join(DEFAULT_STL_DIR, stem)
+    cache = None if args.no_cache else RenderCache()
+
+    if args.output is None:
+        writer = ResultWriter(sys.stdout)
+        rows = run_sweep(scad_path, variants, stl_dir, writer, args.workers, args.timeout, cache)
+    else:
+        json_lines = args.output.endswith((".json", ".jsonl"))
+        with open(args.output, 'w', newline='') as file_obj:
+            writer = ResultWriter(file_obj, json_lines)
+            rows = run_sweep(scad_path, variants, stl_dir, writer, args.workers, args.timeout, cache)
+    failed = sum(not row["ok"] for row in rows)
+    print(f"{len(rows) - failed} variants rendered, {failed} failed", file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
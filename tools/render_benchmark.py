@@ -0,0 +1,140 @@
+#! /usr/bin/env python3
+'''
+Benchmark rendering the top level designs to STL.
+
+For each target this records the wall time, CPU time and peak memory of the
+OpenSCAD process, the number of facets in the STL, and the timings and
+geometry statistics OpenSCAD prints (CGAL time, cache sizes etc.).
+
+    python tools/render_benchmark.py
+    python tools/render_benchmark.py 3Nuts/fibreholderMk5.0-BFA.scad --repeats 3 -o renders.json
+
+Targets are paths relative to the top of the repository.
+'''
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from statistics import median
+from tempfile import mkdtemp
+import shutil
+
+from openscad_cli import count_stl_facets, openscad_version, render
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_TARGETS = [
+    "3Nuts/fibreholderMk3.5.1-OutsideGears+2Bands.scad",
+    "3Nuts/fibreholderMk5.0-BFA.scad",
+    "SpringJaws/fibreholderMk1.3.3.scad",
+    "openscad/main_body.scad",
+]
+
+
+def benchmark_target(target, repeats=1, timeout=None, defines=None):
+    """
+    Render a target `repeats` times and return a dictionary of the results of
+    each run along with the median wall and CPU time.
+    """
+    scad_path = os.path.join(REPO_DIR, target)
+    out_dir = mkdtemp(prefix="render_benchmark_")
+    runs = []
+    try:
+        for i in range(repeats):
+            stl_path = os.path.join(out_dir, f"render_{i}.stl")
+            result = render(scad_path, stl_path, defines=defines, timeout=timeout)
+            ok = result["returncode"] == 0 and os.path.exists(stl_path)
+            runs.append({
+                "ok": ok,
+                "timed_out": result["timed_out"],
+                "wall_time": result["wall_time"],
+                "cpu_time": result["cpu_time"],
+                "peak_rss_kb": result["peak_rss_kb"],
+                "facets": count_stl_facets(stl_path) if ok else None,
+                "openscad_stats": result["stats"],
+                "log": None if ok else result["log"],
+            })
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    good_runs = [run for run in runs if run["ok"]]
+    summary = {"target": target, "defines": dict(defines or {}), "runs": runs}
+    if good_runs:
+        summary["median_wall_time"] = median(run["wall_time"] for run in good_runs)
+        cpu_times = [run["cpu_time"] for run in good_runs if run["cpu_time"] is not None]
+        summary["median_cpu_time"] = median(cpu_times) if cpu_times else None
+        rss = [run["peak_rss_kb"] for run in good_runs if run["peak_rss_kb"] is not None]
+        summary["peak_rss_kb"] = max(rss) if rss else None
+        summary["facets"] = good_runs[-1]["facets"]
+    return summary
+
+def print_summary(summary):
+    """
+    Print one line for a benchmarked target.
+    """
+    if "median_wall_time" not in summary:
+        print(f"{summary['target']}: FAILED", file=sys.stderr)
+        return
+    cpu = summary["median_cpu_time"]
+    rss = summary["peak_rss_kb"]
+    timings = summary["runs"][-1]["openscad_stats"]["timings"]
+    render_time = timings.get("total rendering time")
+    print(
+        f"{summary['target']}: wall {summary['median_wall_time']:.2f}s"
+        + (f", cpu {cpu:.2f}s" if cpu is not None else "")
+        + (f", peak {rss/1024:.0f} MB" if rss is not None else "")
+        + f", {summary['facets']} facets"
+        + (f", OpenSCAD render {render_time:.2f}s" if render_time is not None else ""),
+        file=sys.stderr
+    )
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Benchmark rendering designs to STL.")
+    parser.add_argument(
+        "targets",
+        nargs="*",
+        default=DEFAULT_TARGETS,
+        help="scad files to render, relative to the top of the repository."
+    )
+    parser.add_argument("--repeats", type=int, default=1, help="Renders per target.")
+    parser.add_argument("--timeout", type=float, default=None, help="Timeout per render in seconds.")
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=None,
+        help="File to write the JSON results to, defaults to stdout."
+    )
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Benchmark the targets and write the results as JSON.
+    Returns 1 if any target failed to render.
+    """
+    args = parse_args(argv)
+    summaries = []
+    for target in args.targets:
+        summary = benchmark_target(target, args.repeats, args.timeout)
+        print_summary(summary)
+        summaries.append(summary)
+    report = {
+        "openscad_version": openscad_version(),
+        "platform": platform.platform(),
+        "recorded": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "targets": summaries,
+    }
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as file_obj:
+            json.dump(report, file_obj, indent=2)
+    return 0 if all("median_wall_time" in summary for summary in summaries) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
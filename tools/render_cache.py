@@ -0,0 +1,259 @@
+#! /usr/bin/env python3
+'''
+A content addressed cache of rendered STLs.
+
+The key for a render is a hash of the target's source, the source of every file
+it uses, includes or imports (directly or indirectly), the -D overrides and the
+OpenSCAD version. If nothing has changed the STL is copied from the cache
+rather than rendered again. The least recently used renders are removed once
+the cache is bigger than its size limit.
+
+    python tools/render_cache.py build 3Nuts/fibreholderMk5.0-BFA.scad -o 3Nuts/STLs/5.0/fibreholderMk5.0-BFA.stl
+    python tools/render_cache.py build 3Nuts/fibreholderMk4.0.scad -o out.stl -D gearTol=0.3
+    python tools/render_cache.py stats
+
+The cache is kept in ~/.cache/fibreholders/stl unless STL_CACHE_DIR is set.
+'''
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+from tempfile import mkstemp
+
+from openscad_cli import openscad_version, render, scad_value
+from scad_deps import dependency_closure
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "STL_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "fibreholders", "stl")
+)
+DEFAULT_MAX_BYTES = 2*1024**3
+# Change this to invalidate every cached render
+CACHE_FORMAT = 1
+
+
+def file_digest(path):
+    """
+    Return the sha256 hex digest of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file_obj:
+        for block in iter(lambda: file_obj.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def parse_define(text):
+    """
+    Parse a "name=value" override from the command line. The value is read as
+    JSON if possible (numbers, true/false, lists, quoted strings), otherwise it
+    is used as a string.
+    """
+    name, sep, value = text.partition("=")
+    if not sep or not name.strip():
+        raise ValueError(f"Override must be of the form name=value, not {text!r}")
+    try:
+        return name.strip(), json.loads(value)
+    except json.JSONDecodeError:
+        return name.strip(), value
+
+
+class RenderCache:
+    """
+    A folder of rendered STLs named by the hash of everything they depend on.
+    """
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, version=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._version = version
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def version(self):
+        """
+        The OpenSCAD version, only asked for once.
+        """
+        if self._version is None:
+            self._version = openscad_version()
+        return self._version
+
+    def key(self, scad_path, defines=None):
+        """
+        Return the cache key for rendering `scad_path` with `defines`.
+        Dependencies are hashed along with their path relative to the target, as
+        that is how they are found.
+        """
+        scad_path = os.path.abspath(scad_path)
+        target_dir = os.path.dirname(scad_path)
+        deps, missing = dependency_closure(scad_path)
+        manifest = {
+            "format": CACHE_FORMAT,
+            "openscad": self.version,
+            "target": file_digest(scad_path),
+            "defines": {name: scad_value(value) for name, value in (defines or {}).items()},
+            "dependencies": [
+                [os.path.relpath(dep, target_dir).replace(os.sep, "/"), file_digest(dep)]
+                for dep in deps
+            ],
+            # If a missing library is installed later the key changes
+            "missing": missing,
+        }
+        encoded = json.dumps(manifest, sort_keys=True).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def path_for(self, key):
+        """
+        The path a render with `key` is stored at.
+        """
+        return os.path.join(self.cache_dir, key + ".stl")
+
+    def get(self, key, output_path):
+        """
+        Copy the cached render for `key` to `output_path`. Returns False if
+        it is not cached.
+        """
+        cached = self.path_for(key)
+        try:
+            shutil.copyfile(cached, output_path)
+        except FileNotFoundError:
+            return False
+        # Record the use for least recently used eviction
+        os.utime(cached)
+        return True
+
+    def put(self, key, stl_path):
+        """
+        Add a rendered STL to the cache and evict old renders if needed.
+        """
+        descriptor, temp_path = mkstemp(suffix=".tmp", dir=self.cache_dir)
+        os.close(descriptor)
+        shutil.copyfile(stl_path, temp_path)
+        # Rename so that another process never sees a half written file
+        os.replace(temp_path, self.path_for(key))
+        self.evict()
+
+    def entries(self):
+        """
+        Return a list of (last used time, size, path) for every cached render.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".stl"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """
+        Remove the least recently used renders until the cache fits in max_bytes.
+        """
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """
+        Remove every cached render.
+        """
+        for _, _, path in self.entries():
+            os.remove(path)
+
+    def render(self, scad_path, output_path, defines=None, timeout=None):
+        """
+        Render `scad_path` to `output_path`, using the cache if possible.
+        Returns the result from openscad_cli.render (or a minimal one for a
+        cache hit) with "cached" and "key" added.
+        """
+        key = self.key(scad_path, defines)
+        if self.get(key, output_path):
+            return {
+                "scad": scad_path,
+                "output": output_path,
+                "defines": dict(defines or {}),
+                "returncode": 0,
+                "timed_out": False,
+                "wall_time": 0.0,
+                "cached": True,
+                "key": key,
+            }
+        result = render(scad_path, output_path, defines=defines, timeout=timeout)
+        if result["returncode"] == 0 and os.path.exists(output_path):
+            self.put(key, output_path)
+        result["cached"] = False
+        result["key"] = key
+        return result
+
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Render STLs through a content addressed cache.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Folder for the cache.")
+    parser.add_argument(
+        "--max-size",
+        type=float,
+        default=DEFAULT_MAX_BYTES/1024**2,
+        help="Size limit of the cache in MB."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command in ["build", "key"]:
+        sub = subparsers.add_parser(command)
+        sub.add_argument("target", help="scad file to render")
+        sub.add_argument(
+            "-D",
+            dest="defines",
+            action="append",
+            default=[],
+            help="Override a variable, name=value. Can be repeated."
+        )
+        if command == "build":
+            sub.add_argument("-o", "--output", required=True, help="STL file to write.")
+            sub.add_argument("--timeout", type=float, default=None, help="Render timeout in seconds.")
+    subparsers.add_parser("stats")
+    subparsers.add_parser("clear")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Run the requested command, returning the exit code.
+    """
+    args = parse_args(argv)
+    cache = RenderCache(args.cache_dir, int(args.max_size*1024**2))
+    if args.command == "stats":
+        entries = cache.entries()
+        total = sum(size for _, size, _ in entries)
+        print(f"{len(entries)} renders, {total/1024**2:.1f} MB of {cache.max_bytes/1024**2:.0f} MB")
+        return 0
+    if args.command == "clear":
+        cache.clear()
+        return 0
+    defines = dict(parse_define(text) for text in args.defines)
+    if args.command == "key":
+        print(cache.key(args.target, defines))
+        return 0
+    result = cache.render(args.target, args.output, defines, args.timeout)
+    if result["returncode"] != 0:
+        print(result.get("log", ""), file=sys.stderr)
+        print(f"Failed to render {args.target}", file=sys.stderr)
+        return 1
+    source = "cache" if result["cached"] else f"render ({result['wall_time']:.1f}s)"
+    print(f"{args.output} from {source}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
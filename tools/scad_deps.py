@@ -0,0 +1,321 @@
+#! /usr/bin/env python3
+'''
+Find the files a scad file depends on.
+
+A scad file depends on every file it uses with ``use <...>`` or
+``include <...>``, and on any file it reads with ``import()`` or
+``surface()``. Paths are resolved the way OpenSCAD does: first relative to the
+file, then in the library folders (OPENSCADPATH and the user library folder).
+
+Run as a script this keeps an index of the dependencies of every scad file in
+the repository, which is only updated for files that have changed, and
+answers which files are affected by a change:
+
+    python tools/scad_deps.py affected UsefullBits/utilities.scad
+    git diff --name-only main | xargs python tools/scad_deps.py affected
+    python tools/scad_deps.py deps 3Nuts/fibreholderMk4.0.scad
+'''
+
+import argparse
+import json
+import os
+import re
+import sys
+
+_USE_INCLUDE = re.compile(r"\b(use|include)\s*<([^>]+)>")
+_FILE_CALL = re.compile(r"\b(import|surface)\s*\(\s*(?:file\s*=\s*)?\"((?:[^\"\\]|\\.)*)\"")
+# Comments and strings, strings are matched so that // inside them is kept
+_COMMENT_OR_STRING = re.compile(r"//[^\n]*|/\*.*?\*/|\"(?:[^\"\\]|\\.)*\"", re.DOTALL)
+
+
+def library_paths():
+    """
+    The folders OpenSCAD searches for libraries, in order.
+    """
+    paths = []
+    for path in os.environ.get("OPENSCADPATH", "").split(os.pathsep):
+        if path:
+            paths.append(path)
+    if sys.platform.startswith("linux"):
+        paths.append(os.path.expanduser("~/.local/share/OpenSCAD/libraries"))
+    else:
+        paths.append(os.path.expanduser("~/Documents/OpenSCAD/libraries"))
+    return paths
+
+def strip_comments(source, keep_strings=True):
+    """
+    Remove comments from scad source. Strings are left alone unless
+    `keep_strings` is false, in which case they are emptied.
+    """
+    def replace(match):
+        text = match.group(0)
+        if text.startswith('"'):
+            return text if keep_strings else '""'
+        return " "
+    return _COMMENT_OR_STRING.sub(replace, source)
+
+def parse_dependencies(source):
+    """
+    Return a list of (kind, path) for each dependency in some scad source,
+    where kind is "use", "include", "import" or "surface" and path is as written.
+    """
+    # use and include can't be inside strings, but the file names for import can
+    code = strip_comments(source, keep_strings=False)
+    deps = [(match.group(1), match.group(2).strip()) for match in _USE_INCLUDE.finditer(code)]
+    code = strip_comments(source)
+    deps += [(match.group(1), match.group(2)) for match in _FILE_CALL.finditer(code)]
+    return deps
+
+def resolve(path, from_file, search_paths=None):
+    """
+    Resolve a dependency path as written in `from_file`. Returns the absolute
+    path or None if it can't be found.
+    """
+    if os.path.isabs(path):
+        return os.path.normpath(path) if os.path.isfile(path) else None
+    candidate = os.path.join(os.path.dirname(os.path.abspath(from_file)), path)
+    if os.path.isfile(candidate):
+        return os.path.normpath(candidate)
+    for folder in library_paths() if search_paths is None else search_paths:
+        candidate = os.path.join(folder, path)
+        if os.path.isfile(candidate):
+            return os.path.normpath(candidate)
+    return None
+
+def direct_dependencies(scad_path, search_paths=None):
+    """
+    Return the resolved dependencies of a file as a sorted list of absolute
+    paths, and a sorted list of the dependencies that could not be found.
+    """
+    with open(scad_path, 'r', encoding='utf-8', errors='replace') as file_obj:
+        source = file_obj.read()
+    found = set()
+    missing = set()
+    for _, path in parse_dependencies(source):
+        resolved = resolve(path, scad_path, search_paths)
+        if resolved is None:
+            missing.add(path)
+        else:
+            found.add(resolved)
+    return sorted(found), sorted(missing)
+
+def dependency_closure(scad_path, search_paths=None):
+    """
+    Return every file that `scad_path` depends on, directly or through other
+    files, as a sorted list of absolute paths, along with a sorted list of
+    dependencies that could not be found.
+    Only scad files are followed, imported meshes have no dependencies.
+    """
+    scad_path = os.path.normpath(os.path.abspath(scad_path))
+    seen = set()
+    missing = set()
+    to_visit = [scad_path]
+    while to_visit:
+        path = to_visit.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        if not path.lower().endswith(".scad"):
+            continue
+        found, not_found = direct_dependencies(path, search_paths)
+        missing.update(not_found)
+        to_visit += [dep for dep in found if dep not in seen]
+    seen.discard(scad_path)
+    return sorted(seen), sorted(missing)
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_INDEX = os.path.join(REPO_DIR, ".scad_deps_index.json")
+# Change this to rebuild every index
+INDEX_FORMAT = 1
+
+
+class DependencyIndex:
+    """
+    The direct dependencies of every scad file under a folder, kept in a JSON
+    file. Each file is only parsed again if its modification time or size has
+    changed. Paths are stored relative to the root folder with "/" separators,
+    dependencies outside the root folder are stored as absolute paths.
+    """
+    def __init__(self, root=REPO_DIR, index_path=DEFAULT_INDEX):
+        self.root = os.path.abspath(root)
+        self.index_path = index_path
+        self.files = {}
+        self._dependents = None
+        self.load()
+
+    def _rel(self, path):
+        """
+        Path relative to the root, or absolute if it is outside the root.
+        """
+        rel = os.path.relpath(path, self.root)
+        if rel.startswith(".."):
+            return os.path.abspath(path)
+        return rel.replace(os.sep, "/")
+
+    def _abs(self, rel):
+        """
+        Absolute path for a path stored in the index.
+        """
+        return os.path.normpath(os.path.join(self.root, rel))
+
+    def load(self):
+        """
+        Load the index from disk, if it exists and is for this root folder.
+        """
+        try:
+            with open(self.index_path, 'r') as file_obj:
+                data = json.load(file_obj)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if data.get("format") == INDEX_FORMAT and data.get("root") == self.root:
+            self.files = data["files"]
+
+    def save(self):
+        """
+        Write the index to disk.
+        """
+        data = {"format": INDEX_FORMAT, "root": self.root, "files": self.files}
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, 'w') as file_obj:
+            json.dump(data, file_obj)
+        os.replace(temp_path, self.index_path)
+
+    def scad_files(self):
+        """
+        Every scad file under the root folder, relative to the root.
+        """
+        found = []
+        for folder, subfolders, filenames in os.walk(self.root):
+            subfolders[:] = [name for name in subfolders if not name.startswith(".")]
+            for filename in filenames:
+                if filename.lower().endswith(".scad"):
+                    found.append(self._rel(os.path.join(folder, filename)))
+        return sorted(found)
+
+    def update(self):
+        """
+        Parse any files that are new or have changed since the index was saved,
+        and drop any that have been deleted. Files with dependencies that could
+        not be found are parsed again if files have been added, in case they now
+        resolve. Returns the number of files parsed.
+        """
+        current = self.scad_files()
+        files_added = bool(set(current) - set(self.files))
+        updated = {}
+        parsed = 0
+        for rel in current:
+            stat = os.stat(self._abs(rel))
+            entry = self.files.get(rel)
+            if (
+                entry is not None
+                and entry["mtime_ns"] == stat.st_mtime_ns
+                and entry["size"] == stat.st_size
+                and not (files_added and entry["missing"])
+            ):
+                updated[rel] = entry
+                continue
+            deps, missing = direct_dependencies(self._abs(rel))
+            updated[rel] = {
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "deps": [self._rel(dep) for dep in deps],
+                "missing": missing,
+            }
+            parsed += 1
+        changed = parsed > 0 or set(updated) != set(self.files)
+        self.files = updated
+        self._dependents = None
+        if changed:
+            self.save()
+        return parsed
+
+    def dependents(self):
+        """
+        Reverse of the dependency graph, the files that directly depend on each file.
+        """
+        if self._dependents is None:
+            self._dependents = {}
+            for rel, entry in self.files.items():
+                for dep in entry["deps"]:
+                    self._dependents.setdefault(dep, set()).add(rel)
+        return self._dependents
+
+    def dependencies(self, path):
+        """
+        Every file that `path` depends on, directly or indirectly, sorted.
+        """
+        seen = set()
+        to_visit = [self._rel(os.path.abspath(path))]
+        while to_visit:
+            rel = to_visit.pop()
+            for dep in self.files.get(rel, {}).get("deps", []):
+                if dep not in seen:
+                    seen.add(dep)
+                    to_visit.append(dep)
+        return sorted(seen)
+
+    def affected(self, paths, targets_only=True):
+        """
+        Every scad file affected by a change to any of `paths`, including the
+        paths themselves if they are scad files. If `targets_only` is true only
+        files that no other file depends on (i.e. designs that are rendered,
+        rather than libraries) are returned.
+        """
+        dependents = self.dependents()
+        seen = set()
+        to_visit = [self._rel(os.path.abspath(path)) for path in paths]
+        while to_visit:
+            rel = to_visit.pop()
+            if rel in seen:
+                continue
+            seen.add(rel)
+            to_visit += dependents.get(rel, ())
+        affected = {rel for rel in seen if rel in self.files}
+        if targets_only:
+            affected = {rel for rel in affected if rel not in dependents}
+        return sorted(affected)
+
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Dependency index for the scad files.")
+    parser.add_argument("--index", default=DEFAULT_INDEX, help="Index file to use.")
+    parser.add_argument("--root", default=REPO_DIR, help="Folder to index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    affected = subparsers.add_parser("affected", help="List files affected by changed files.")
+    affected.add_argument("paths", nargs="+", help="Changed files.")
+    affected.add_argument(
+        "--all",
+        action="store_true",
+        help="List every affected scad file, not just the ones nothing depends on."
+    )
+    deps = subparsers.add_parser("deps", help="List every dependency of a file.")
+    deps.add_argument("path")
+    subparsers.add_parser("index", help="Update the index and report any missing files.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Run the requested command, returning the exit code.
+    """
+    args = parse_args(argv)
+    index = DependencyIndex(args.root, args.index)
+    parsed = index.update()
+    if args.command == "affected":
+        for rel in index.affected(args.paths, targets_only=not args.all):
+            print(rel)
+    elif args.command == "deps":
+        for rel in index.dependencies(args.path):
+            print(rel)
+    else:
+        print(f"{len(index.files)} scad files indexed, {parsed} parsed.")
+        for rel, entry in sorted(index.files.items()):
+            for missing in entry["missing"]:
+                print(f"{rel}: cannot find {missing}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
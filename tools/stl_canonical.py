@@ -0,0 +1,170 @@
+#! /usr/bin/env python3
+'''
+Write STLs in a canonical form, so the same mesh always gives the same bytes.
+
+Rendering the same model twice can give STLs that differ byte for byte: the
+triangles come out in a different order, each triangle can start at a
+different vertex, and the header can change. The canonical form is:
+
+* every coordinate rounded to a multiple of the quantum (1e-4 mm by default),
+* each triangle starting at its lowest vertex (x, then y, then z), keeping
+  the order of the vertices around the triangle so the normal is unchanged,
+* the triangles sorted, and
+* a fixed header and normals worked out from the rounded vertices.
+
+The sha256 of the canonical file identifies the mesh.
+
+    python tools/stl_canonical.py 3Nuts/STLs/3.5/gearFrame.stl -o gearFrame.stl
+    python tools/stl_canonical.py --in-place build/stl/3Nuts/*.stl
+    python tools/stl_canonical.py --hash-only 3Nuts/STLs/*/*.stl
+'''
+
+import argparse
+import hashlib
+import os
+import sys
+from tempfile import mkstemp
+
+import numpy as np
+
+from stl_mesh import HEADER_BYTES, STL_DTYPE, load_triangles
+
+DEFAULT_QUANTUM = 1e-4
+
+
+def quantise(triangles, quantum=DEFAULT_QUANTUM):
+    """
+    Round the vertices of an (n, 3, 3) array of triangles to integer multiples
+    of `quantum`, returned as int64.
+    """
+    return np.round(np.asarray(triangles, dtype=np.float64)/quantum).astype(np.int64)
+
+def canonical_order(quantised):
+    """
+    Put quantised triangles into canonical order: each is rotated to the
+    smallest of its three rotations (so it starts at its lowest vertex, and
+    triangles with a repeated vertex still have a single form), then the
+    triangles are sorted. Returns a new (n, 3, 3) array.
+    """
+    quantised = np.asarray(quantised, dtype=np.int64)
+    if not len(quantised):
+        return quantised.reshape(0, 3, 3)
+    # Rank every vertex, equal vertices get the same rank
+    _, ranks = np.unique(quantised.reshape(-1, 3), axis=0, return_inverse=True)
+    ranks = ranks.reshape(-1, 3)
+    # Rotating (rather than sorting) the vertices keeps the winding
+    rotations = (np.arange(3)[:, None] + np.arange(3)) % 3
+    rotated_ranks = ranks[:, rotations]
+    # Compare the rotations' ranks like tuples, keeping the smallest
+    best = np.zeros(len(ranks), dtype=np.int64)
+    for rotation in (1, 2):
+        current = rotated_ranks[np.arange(len(ranks)), best]
+        candidate = rotated_ranks[:, rotation]
+        smaller = np.zeros(len(ranks), dtype=bool)
+        equal = np.ones(len(ranks), dtype=bool)
+        for column in range(3):
+            smaller |= equal & (candidate[:, column] < current[:, column])
+            equal &= candidate[:, column] == current[:, column]
+        best[smaller] = rotation
+    order = rotations[best]
+    rotated = np.take_along_axis(quantised, order[:, :, None], axis=1)
+    flat = rotated.reshape(-1, 9)
+    # lexsort sorts by the last key first
+    return rotated[np.lexsort(flat.T[::-1])]
+
+def canonical_triangles(triangles, quantum=DEFAULT_QUANTUM):
+    """
+    The canonical quantised form of an (n, 3, 3) array of triangles, as int64
+    multiples of `quantum`.
+    """
+    return canonical_order(quantise(triangles, quantum))
+
+def header_for(quantum):
+    """
+    The fixed 80 byte header of a canonical STL.
+    """
+    return f"canonical binary STL, quantum {quantum:g} mm".encode("ascii").ljust(HEADER_BYTES, b" ")
+
+def stl_records(vertices):
+    """
+    Binary STL records for an (n, 3, 3) array of vertices, with unit normals
+    worked out from the vertices (zero for degenerate triangles).
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    records = np.zeros(len(vertices), dtype=STL_DTYPE)
+    if not len(vertices):
+        return records
+    normals = np.cross(vertices[:, 1] - vertices[:, 0], vertices[:, 2] - vertices[:, 0])
+    lengths = np.linalg.norm(normals, axis=1)
+    nonzero = lengths > 0
+    normals[nonzero] /= lengths[nonzero, None]
+    records["normal"] = normals
+    records["vertices"] = vertices
+    return records
+
+def canonical_stl_bytes(triangles, quantum=DEFAULT_QUANTUM):
+    """
+    The bytes of the canonical binary STL for an (n, 3, 3) array of triangles.
+    """
+    records = stl_records(canonical_triangles(triangles, quantum)*quantum)
+    return header_for(quantum) + np.uint32(len(records)).tobytes() + records.tobytes()
+
+def write_canonical_stl(in_path, out_path, quantum=DEFAULT_QUANTUM):
+    """
+    Write the canonical form of an STL to `out_path`, which can be the same as
+    `in_path`. Returns the sha256 hex digest of the file written.
+    """
+    data = canonical_stl_bytes(load_triangles(in_path), quantum)
+    folder = os.path.dirname(os.path.abspath(out_path))
+    descriptor, temp_path = mkstemp(suffix=".tmp", dir=folder)
+    with os.fdopen(descriptor, 'wb') as file_obj:
+        file_obj.write(data)
+    # Written to a temporary file as in_path may be memory mapped and is replaced
+    os.replace(temp_path, out_path)
+    return hashlib.sha256(data).hexdigest()
+
+def mesh_hash(path, quantum=DEFAULT_QUANTUM):
+    """
+    The sha256 hex digest of the canonical form of an STL, without writing it.
+    """
+    return hashlib.sha256(canonical_stl_bytes(load_triangles(path), quantum)).hexdigest()
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Write STLs in a canonical form and hash them.")
+    parser.add_argument("stls", nargs="+", help="STL files to canonicalise.")
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument("-o", "--output", default=None, help="File to write, for a single STL.")
+    output.add_argument("--in-place", action="store_true", help="Replace each STL with its canonical form.")
+    output.add_argument("--hash-only", action="store_true", help="Only print the hash of each STL.")
+    parser.add_argument(
+        "--quantum",
+        type=float,
+        default=DEFAULT_QUANTUM,
+        help="Coordinates are rounded to a multiple of this, in mm."
+    )
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Canonicalise or hash the STLs, printing the hash and path of each.
+    """
+    args = parse_args(argv)
+    if args.output is not None and len(args.stls) != 1:
+        print("-o can only be used with one STL", file=sys.stderr)
+        return 1
+    if not (args.output or args.in_place or args.hash_only):
+        print("Give -o, --in-place or --hash-only", file=sys.stderr)
+        return 1
+    for path in args.stls:
+        if args.hash_only:
+            digest = mesh_hash(path, args.quantum)
+        else:
+            digest = write_canonical_stl(path, args.output or path, args.quantum)
+        print(f"{digest}  {path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
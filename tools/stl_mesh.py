@@ -0,0 +1,217 @@
+#! /usr/bin/env python3
+'''
+Read STL files with NumPy and measure the meshes in them.
+
+Binary STLs are memory mapped straight into a structured array, so nothing is
+copied until it is used, and ASCII STLs are read a block of triangles at a
+time. The triangle count, bounding box, surface area, signed volume and
+centroid of a mesh are worked out on whole arrays at once.
+
+    python tools/stl_mesh.py 3Nuts/STLs/3.5/interGearBrimmed.stl
+    python tools/stl_mesh.py --json stl_metrics.json
+
+With no paths every STL in the repository is measured, spread over a pool of
+processes.
+'''
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEADER_BYTES = 80
+# One triangle of a binary STL, 50 bytes with no padding
+STL_DTYPE = np.dtype([
+    ("normal", "<f4", (3,)),
+    ("vertices", "<f4", (3, 3)),
+    ("attributes", "<u2"),
+])
+ASCII_BLOCK = 65536
+
+
+def is_binary_stl(path):
+    """
+    True if a file is a binary STL. The size of a binary STL is set by the
+    triangle count in its header, ASCII files start with "solid" (but so do
+    some binary ones, so the size is checked first).
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as file_obj:
+        header = file_obj.read(HEADER_BYTES + 4)
+    if len(header) < HEADER_BYTES + 4:
+        return False
+    if size == HEADER_BYTES + 4 + STL_DTYPE.itemsize*int.from_bytes(header[80:84], "little"):
+        return True
+    return not header.lstrip().startswith(b"solid")
+
+def map_binary_stl(path):
+    """
+    Memory map a binary STL as an array of STL_DTYPE records. The count is
+    taken from the file size, as some programs leave it as 0 in the header.
+    """
+    count = (os.path.getsize(path) - HEADER_BYTES - 4)//STL_DTYPE.itemsize
+    if count <= 0:
+        return np.zeros(0, dtype=STL_DTYPE)
+    return np.memmap(path, dtype=STL_DTYPE, mode='r', offset=HEADER_BYTES + 4, shape=(count,))
+
+def iter_ascii_triangles(path, block=ASCII_BLOCK):
+    """
+    Read an ASCII STL `block` triangles at a time, yielding (n, 3, 3) float32
+    arrays of vertices.
+    """
+    coords = []
+    with open(path, 'rb') as file_obj:
+        for line in file_obj:
+            words = line.split()
+            if words and words[0] == b"vertex":
+                coords += words[1:4]
+                if len(coords) == 9*block:
+                    yield np.array(coords, dtype=np.float32).reshape(-1, 3, 3)
+                    coords = []
+    if coords:
+        # An unfinished triangle at the end of the file is dropped
+        usable = len(coords) - len(coords) % 9
+        yield np.array(coords[:usable], dtype=np.float32).reshape(-1, 3, 3)
+
+def load_triangles(path):
+    """
+    The vertices of every triangle in an STL, as an (n, 3, 3) float32 array.
+    For binary files this is a view of the memory mapped file.
+    """
+    if is_binary_stl(path):
+        return map_binary_stl(path)["vertices"]
+    blocks = list(iter_ascii_triangles(path))
+    if not blocks:
+        return np.zeros((0, 3, 3), dtype=np.float32)
+    return np.concatenate(blocks)
+
+def mesh_metrics(triangles):
+    """
+    Measure a mesh given as an (n, 3, 3) array of triangle vertices. Returns
+    a dictionary of the triangle count, bounding box, surface area, signed
+    volume (positive if the normals point out) and centroid of the solid. The
+    centroid is of the surface if the volume is zero. Sums are done in float64.
+    """
+    triangles = np.asarray(triangles, dtype=np.float64)
+    metrics = {
+        "triangles": int(len(triangles)),
+        "bbox_min": None,
+        "bbox_max": None,
+        "area": 0.0,
+        "volume": 0.0,
+        "centroid": None,
+    }
+    if not len(triangles):
+        return metrics
+    points = triangles.reshape(-1, 3)
+    metrics["bbox_min"] = points.min(axis=0).tolist()
+    metrics["bbox_max"] = points.max(axis=0).tolist()
+    a, b, c = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    areas = 0.5*np.linalg.norm(np.cross(b - a, c - a), axis=1)
+    # Signed volume of the tetrahedron from the origin to each triangle
+    volumes = np.einsum("ij,ij->i", a, np.cross(b, c))/6
+    area = areas.sum()
+    volume = volumes.sum()
+    metrics["area"] = float(area)
+    metrics["volume"] = float(volume)
+    if volume != 0:
+        # Centroid of each tetrahedron is (a + b + c + origin)/4
+        metrics["centroid"] = ((volumes @ (a + b + c))/(4*volume)).tolist()
+    elif area != 0:
+        metrics["centroid"] = ((areas @ (a + b + c))/(3*area)).tolist()
+    return metrics
+
+def stl_metrics(path):
+    """
+    Measure the mesh in an STL file. Returns the metrics with "path" and
+    "binary" added, or "path" and "error" if the file can't be read.
+    """
+    try:
+        binary = is_binary_stl(path)
+        metrics = mesh_metrics(load_triangles(path))
+    except (OSError, ValueError) as err:
+        return {"path": path, "error": str(err)}
+    return dict(metrics, path=path, binary=binary)
+
+def find_stls(paths):
+    """
+    Every STL file in `paths`, which can be folders or files, sorted.
+    Hidden folders are skipped.
+    """
+    found = set()
+    for path in paths:
+        if os.path.isfile(path):
+            found.add(os.path.normpath(path))
+            continue
+        for folder, subfolders, filenames in os.walk(path):
+            subfolders[:] = [name for name in subfolders if not name.startswith(".")]
+            for filename in filenames:
+                if filename.lower().endswith(".stl"):
+                    found.add(os.path.normpath(os.path.join(folder, filename)))
+    return sorted(found)
+
+def scan(paths, workers=None):
+    """
+    Measure every STL in `paths` on a pool of `workers` processes. Returns the
+    metrics of each file in path order.
+    """
+    stls = find_stls(paths)
+    if workers == 1 or len(stls) < 2:
+        return [stl_metrics(path) for path in stls]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Small chunks keep the pool busy when file sizes vary a lot
+        return list(executor.map(stl_metrics, stls, chunksize=4))
+
+def print_metrics(results, file=sys.stdout):
+    """
+    Print a line for each measured file.
+    """
+    for result in results:
+        if "error" in result:
+            print(f"{result['path']}: {result['error']}", file=file)
+            continue
+        if result["bbox_min"] is None:
+            print(f"{result['path']}: empty", file=file)
+            continue
+        size = np.subtract(result["bbox_max"], result["bbox_min"])
+        print(
+            f"{result['path']}: {result['triangles']} triangles, "
+            f"{size[0]:.2f} x {size[1]:.2f} x {size[2]:.2f} mm, "
+            f"area {result['area']:.1f} mm^2, volume {result['volume']:.1f} mm^3",
+            file=file
+        )
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Measure the meshes in STL files.")
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        default=[REPO_DIR],
+        help="STL files or folders to search, defaults to the whole repository."
+    )
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Processes to use.")
+    parser.add_argument("--json", default=None, help="Write the metrics to this JSON file.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Measure the STLs, returning 1 if any could not be read.
+    """
+    args = parse_args(argv)
+    results = scan(args.paths, args.workers)
+    print_metrics(results)
+    if args.json is not None:
+        with open(args.json, 'w') as file_obj:
+            json.dump(results, file_obj, indent=2)
+    return 1 if any("error" in result for result in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
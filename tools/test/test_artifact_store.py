@@ -0,0 +1,68 @@
+#! /usr/bin/env python3
+'''
+Tests for the compressed mesh store.
+'''
+
+import os
+import shutil
+import sys
+import unittest
+from tempfile import mkdtemp
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import artifact_store  # pylint: disable=wrong-import-position
+import stl_canonical  # pylint: disable=wrong-import-position
+from test_stl_mesh import box_triangles, write_binary_stl  # pylint: disable=wrong-import-position
+
+
+class TestArtifactStore(unittest.TestCase):
+    """
+    Meshes are stored once and come back as their canonical STL
+    """
+    def setUp(self):
+        self.folder = mkdtemp()
+        self.store = artifact_store.ArtifactStore(os.path.join(self.folder, "store"))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_round_trip(self):
+        """
+        A stored STL decodes to its canonical form, and is only stored once
+        """
+        first = os.path.join(self.folder, "first.stl")
+        second = os.path.join(self.folder, "second.stl")
+        write_binary_stl(first, box_triangles(offset=(-3, 0.25, 7)))
+        write_binary_stl(second, box_triangles(offset=(-3, 0.25, 7))[::-1])
+        digest, new = self.store.add(first)
+        self.assertTrue(new)
+        self.assertEqual(self.store.add(second), (digest, False))
+        self.assertEqual(self.store.digests(), [digest])
+        self.assertEqual(self.store.resolve(digest[:6]), digest)
+        out = os.path.join(self.folder, "out.stl")
+        self.store.get(digest, out)
+        self.assertEqual(stl_canonical.mesh_hash(out), digest)
+        self.assertEqual(stl_canonical.mesh_hash(first), digest)
+
+    def test_arrays(self):
+        """
+        The unpacked arrays can be memory mapped
+        """
+        path = os.path.join(self.folder, "box.stl")
+        write_binary_stl(path, box_triangles())
+        digest, _ = self.store.add(path)
+        points, faces = self.store.arrays(digest)
+        self.assertIsInstance(points, np.memmap)
+        self.assertEqual(points.shape, (8, 3))
+        np.testing.assert_allclose(
+            np.sort(points[faces].reshape(-1, 9), axis=0),
+            np.sort(box_triangles().reshape(-1, 9), axis=0)
+        )
+        # The second time the files already exist
+        np.testing.assert_array_equal(self.store.arrays(digest)[1], faces)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+#! /usr/bin/env python3
+'''
+Tests for checking gear pairs mesh.
+'''
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import gear_mesh  # pylint: disable=wrong-import-position
+
+
+class TestGearShape(unittest.TestCase):
+    """
+    Looking up the outline of a gear
+    """
+    def test_radius(self):
+        """
+        The radius in the direction of each corner of the outline is the
+        distance to that corner
+        """
+        shape = gear_mesh.GearShape(13, 5, 30, 0.5, 0)
+        corners = shape.outline
+        radii = shape.radius(np.arctan2(corners[:, 1], corners[:, 0]))
+        # At the feet of the teeth two corners share a direction
+        turn = np.diff(np.unwrap(np.arctan2(corners[:, 1], corners[:, 0])))
+        feet = np.abs(np.concatenate([[1], turn])) < 1e-9
+        feet |= np.abs(np.concatenate([turn, [1]])) < 1e-9
+        self.assertEqual(np.count_nonzero(feet), 4*13)
+        np.testing.assert_allclose(radii[~feet], np.hypot(*corners[~feet].T), atol=1e-9)
+
+
+class TestCheckPair(unittest.TestCase):
+    """
+    The gears from the 3Nuts designs mesh as expected
+    """
+    def check(self, gear_tol, pressure_angle=30, mate_phase=0):
+        """
+        Check the 21 and 13 tooth gears gear_tol beyond perfect meshing
+        """
+        gear = gear_mesh.GearShape(21, 5, pressure_angle, 0.5, 0)
+        mate = gear_mesh.GearShape(13, 5, pressure_angle, 0.5, 0)
+        distance = gear.dims["pitch_radius"] + mate.dims["pitch_radius"] + gear_tol
+        return gear_mesh.check_pair(gear, mate, distance, steps=90, mate_phase=mate_phase)
+
+    def test_perfect_mesh(self):
+        """
+        At the pitch radii the gears touch with no backlash
+        """
+        result = self.check(0)
+        self.assertLess(result["interference"], gear_mesh.INTERFERENCE_TOLERANCE)
+        self.assertLess(result["max_backlash"], 0.01)
+
+    def test_backlash(self):
+        """
+        Moving the gears apart gives about 2*tan(pressure angle) backlash per mm
+        """
+        result = self.check(0.2)
+        self.assertEqual(result["interference"], 0)
+        expected = 2*0.2*np.tan(np.radians(30))
+        self.assertAlmostEqual(result["min_backlash"], expected, delta=0.02)
+        self.assertAlmostEqual(result["max_backlash"], expected, delta=0.02)
+
+    def test_interference(self):
+        """
+        Gears too close together, or turned a tooth out, interfere
+        """
+        self.assertGreater(self.check(-0.2)["interference"], 0.1)
+        self.assertGreater(self.check(0.2, mate_phase=180/13)["interference"], 0.1)
+
+    def test_grid(self):
+        """
+        A grid gives a row for every combination, with the centre distance
+        """
+        grid = {
+            "teeth": [21],
+            "mate_teeth": [13, 12],
+            "spacing": [5],
+            "pressure_angle": [30],
+            "clearance": [0.5],
+            "backlash": [0],
+            "gear_tol": [0.1, 0.2],
+        }
+        rows = list(gear_mesh.check_grid(grid, steps=30))
+        self.assertEqual(len(rows), 4)
+        self.assertTrue(all(row["ok"] for row in rows))
+        self.assertAlmostEqual(rows[0]["centre_distance"], (21 + 13)*5/(2*np.pi) + 0.1)
+
+    def test_pointed_teeth(self):
+        """
+        A gear whose teeth come to a point gives a failed row with the error,
+        and the rest of the grid is still checked
+        """
+        grid = {
+            "teeth": [8],
+            "mate_teeth": [13],
+            "spacing": [5],
+            "pressure_angle": [30],
+            "clearance": [0.5],
+            "backlash": [0.5, 0],
+            "gear_tol": [0],
+        }
+        rows = list(gear_mesh.check_grid(grid, steps=30))
+        self.assertEqual(len(rows), 2)
+        self.assertFalse(rows[0]["ok"])
+        self.assertIn("8 teeth", rows[0]["error"])
+        self.assertIsNone(rows[0]["interference"])
+        self.assertTrue(rows[1]["ok"])
+        self.assertIsNone(rows[1]["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
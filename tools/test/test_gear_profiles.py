@@ -0,0 +1,95 @@
+#! /usr/bin/env python3
+'''
+Tests for the involute gear outlines used by ourGear.
+'''
+
+import os
+import shutil
+import sys
+import unittest
+from tempfile import mkdtemp
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import gear_profiles  # pylint: disable=wrong-import-position
+
+
+class TestGearOutline(unittest.TestCase):
+    """
+    The outlines are the same shape as MCAD's union of polygons
+    """
+    def assert_matches_mcad(self, *params):
+        """
+        Check the outline for some gear parameters against MCAD's pieces
+        """
+        outline = gear_profiles.gear_outline(*params)
+        error = gear_profiles.compare_with_mcad(outline, gear_profiles.mcad_pieces(*params), samples=4000)
+        self.assertLess(error, 1e-6)
+
+    def test_gearbox_gears(self):
+        """
+        The gears used in the 3Nuts designs, with the parameters in gearbox.scad
+        """
+        for teeth in [13, 21]:
+            self.assert_matches_mcad(teeth)
+
+    def test_backlash(self):
+        """
+        With backlash the root polygon is not symmetric about each tooth
+        """
+        self.assert_matches_mcad(21, 5, 20, 0, 0.3, 25)
+
+    def test_tooth_thickness(self):
+        """
+        Each tooth is half the tooth spacing wide at the pitch circle
+        """
+        dims = gear_profiles.gear_dimensions(13, 5, 30, 0.5)
+        flank = gear_profiles.tooth_flank(dims, facets=1000)
+        radii = np.hypot(*flank.T)
+        angle = np.interp(dims["pitch_radius"], radii, np.arctan2(flank[:, 1], flank[:, 0]))
+        self.assertAlmostEqual(-2*angle*dims["pitch_radius"], 2.5, places=4)
+
+    def test_pointed_teeth(self):
+        """
+        Teeth that come to a point below the outer circle are refused
+        """
+        with self.assertRaises(ValueError):
+            gear_profiles.gear_outline(8, 5, 30, 0.2, 0.5)
+
+    def test_pointed_teeth_skipped(self):
+        """
+        The generator leaves out gears it can't make and reports a failure
+        """
+        folder = mkdtemp()
+        try:
+            output = os.path.join(folder, "profiles.scad")
+            self.assertEqual(gear_profiles.main(["--teeth", "8", "13", "--backlash", "0.5", "-o", output]), 1)
+            with open(output) as file_obj:
+                scad = file_obj.read()
+            self.assertIn("[[13,", scad)
+            self.assertNotIn("[[8,", scad)
+        finally:
+            shutil.rmtree(folder)
+
+    def test_committed_profiles(self):
+        """
+        gear_profiles.scad is what the generator writes by default
+        """
+        profiles = []
+        for teeth in gear_profiles.DEFAULT_TEETH:
+            params = (
+                teeth,
+                gear_profiles.DEFAULT_SPACING,
+                gear_profiles.DEFAULT_PRESSURE_ANGLE,
+                gear_profiles.DEFAULT_CLEARANCE,
+                gear_profiles.DEFAULT_BACKLASH,
+                gear_profiles.DEFAULT_FACETS,
+            )
+            profiles.append((gear_profiles.profile_key(*params), gear_profiles.gear_outline(*params)))
+        with open(gear_profiles.DEFAULT_OUTPUT) as file_obj:
+            self.assertEqual(file_obj.read(), gear_profiles.profiles_scad(profiles))
+
+
+if __name__ == "__main__":
+    unittest.main()
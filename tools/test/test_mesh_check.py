@@ -0,0 +1,74 @@
+#! /usr/bin/env python3
+'''
+Tests for checking meshes are watertight and manifold.
+'''
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import mesh_check  # pylint: disable=wrong-import-position
+from test_stl_mesh import box_triangles  # pylint: disable=wrong-import-position
+
+
+class TestCheckMesh(unittest.TestCase):
+    """
+    Each kind of problem is found in an otherwise closed box
+    """
+    def problems(self, triangles):
+        """
+        The problems found in a mesh, with their counts
+        """
+        report = mesh_check.check_mesh(triangles)
+        return {name: report[name] for name in mesh_check.PROBLEMS if report[name]}
+
+    def test_closed(self):
+        """
+        A box is watertight, even if its vertices differ by rounding errors
+        """
+        box = box_triangles() + np.random.default_rng(0).uniform(-1e-7, 1e-7, (12, 3, 3))
+        report = mesh_check.check_mesh(box)
+        self.assertTrue(report["watertight"])
+        self.assertEqual(report["vertices"], 8)
+        self.assertEqual(self.problems(box), {})
+
+    def test_hole(self):
+        """
+        Removing a triangle leaves three open edges
+        """
+        self.assertEqual(self.problems(box_triangles()[1:]), {"open_edges": 3})
+        self.assertFalse(mesh_check.check_mesh(box_triangles()[1:])["watertight"])
+
+    def test_flipped(self):
+        """
+        A flipped triangle has all three edges the wrong way round
+        """
+        box = box_triangles()
+        box[0] = box[0][::-1]
+        self.assertEqual(self.problems(box), {"inconsistent_edges": 3})
+
+    def test_duplicate(self):
+        """
+        A repeated triangle is a duplicate and makes its edges non-manifold
+        """
+        box = box_triangles()
+        problems = self.problems(np.concatenate([box, box[:1]]))
+        self.assertEqual(problems["duplicate_faces"], 1)
+        self.assertEqual(problems["non_manifold_edges"], 3)
+
+    def test_degenerate(self):
+        """
+        Triangles with no area are degenerate but don't break the surface
+        """
+        box = box_triangles()
+        sliver = np.array([[box[0][0], box[0][1], box[0][1]]])
+        line = np.array([[[0, 0, 0], [0.5, 0, 0], [1, 0, 0]]])
+        self.assertEqual(self.problems(np.concatenate([box, sliver])), {"degenerate_faces": 1})
+        self.assertEqual(self.problems(np.concatenate([box, line]))["degenerate_faces"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
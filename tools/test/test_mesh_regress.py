@@ -0,0 +1,75 @@
+#! /usr/bin/env python3
+'''
+Tests for comparing meshes with the committed STLs.
+'''
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import mesh_regress  # pylint: disable=wrong-import-position
+from test_stl_mesh import box_triangles  # pylint: disable=wrong-import-position
+
+
+def split_triangles(triangles):
+    """
+    Split each triangle in two at the middle of its first edge.
+    """
+    a, b, c = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    middle = (a + b)/2
+    return np.concatenate([np.stack([a, middle, c], 1), np.stack([middle, b, c], 1)])
+
+class TestCompareMeshes(unittest.TestCase):
+    """
+    Meshes are compared by their invariants, then by sampled Hausdorff distance
+    """
+    def test_reordered(self):
+        """
+        The same triangles in a different order pass on the invariants
+        """
+        box = box_triangles()
+        result = mesh_regress.compare_meshes(box, box[::-1])
+        self.assertTrue(result["ok"])
+        self.assertEqual(result["stage"], "invariants")
+
+    def test_retriangulated(self):
+        """
+        The same surface split into more triangles passes
+        """
+        result = mesh_regress.compare_meshes(box_triangles(), split_triangles(box_triangles()))
+        self.assertTrue(result["ok"])
+        # The distance is to the surface, not to the points sampled on it
+        distance = mesh_regress.sampled_hausdorff(box_triangles(), split_triangles(box_triangles()), 500)
+        self.assertLess(distance, 1e-9)
+
+    def test_moved(self):
+        """
+        A box that has grown fails on its bounding box
+        """
+        result = mesh_regress.compare_meshes(box_triangles(), box_triangles(size=(1, 2, 3.1)))
+        self.assertFalse(result["ok"])
+        self.assertEqual(result["stage"], "bbox")
+
+    def test_dent(self):
+        """
+        A dent inside the bounding box is found by the Hausdorff distance
+        """
+        box = box_triangles(size=(2, 2, 2))
+        # A pyramid pushed into the top face
+        apex = np.array([1, 1, 1.5])
+        corners = np.array([[0, 0, 2], [2, 0, 2], [2, 2, 2], [0, 2, 2]])
+        top = np.array([
+            [corners[i], corners[(i + 1) % 4], apex] for i in range(4)
+        ])
+        dented = np.concatenate([box[box[:, :, 2].min(axis=1) < 2], top])
+        result = mesh_regress.compare_meshes(box, dented, samples=5000)
+        self.assertFalse(result["ok"])
+        self.assertEqual(result["stage"], "hausdorff")
+        self.assertAlmostEqual(result["hausdorff"], 0.5, delta=0.05)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+#! /usr/bin/env python3
+'''
+Tests for finding and indexing scad dependencies.
+'''
+
+import os
+import shutil
+import sys
+import time
+import unittest
+from tempfile import mkdtemp
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import scad_deps  # pylint: disable=wrong-import-position
+
+
+def write(path, text):
+    """
+    Write a file, making its folder if needed.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file_obj:
+        file_obj.write(text)
+
+class TestParseDependencies(unittest.TestCase):
+    """
+    Dependencies are found in use, include, import and surface but not in comments
+    """
+    def test(self):
+        """
+        Check every kind of dependency is found and commented ones are ignored
+        """
+        source = '''
+            use <./a.scad>
+            include <../lib/b.scad>
+            //use <c.scad>
+            /* include <d.scad>
+               import("e.stl"); */
+            import("f.stl");
+            translate([0,0,1]) import(file = "g.dxf");
+            surface(file="h.dat");
+            echo("use <not_a_dep.scad> // not a comment");
+        '''
+        self.assertEqual(
+            scad_deps.parse_dependencies(source),
+            [
+                ("use", "./a.scad"),
+                ("include", "../lib/b.scad"),
+                ("import", "f.stl"),
+                ("import", "g.dxf"),
+                ("surface", "h.dat"),
+            ]
+        )
+
+class TestDependencyIndex(unittest.TestCase):
+    """
+    Check the index finds dependencies, affected files and updates on changes
+    """
+    def setUp(self):
+        self.root = mkdtemp()
+        write(os.path.join(self.root, "lib", "base.scad"), "module base(){}\n")
+        write(os.path.join(self.root, "lib", "mid.scad"), "use <./base.scad>\n")
+        write(os.path.join(self.root, "designs", "one.scad"), "use <../lib/mid.scad>\n")
+        write(os.path.join(self.root, "designs", "two.scad"), "include <../lib/base.scad>\n")
+        write(os.path.join(self.root, "designs", "three.scad"), "cube(1);\n")
+        self.index_path = os.path.join(self.root, "index.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_affected(self):
+        """
+        A change to the base library affects both designs that use it
+        """
+        index = scad_deps.DependencyIndex(self.root, self.index_path)
+        self.assertEqual(index.update(), 5)
+        base = os.path.join(self.root, "lib", "base.scad")
+        self.assertEqual(index.affected([base]), ["designs/one.scad", "designs/two.scad"])
+        self.assertEqual(
+            index.affected([base], targets_only=False),
+            ["designs/one.scad", "designs/two.scad", "lib/base.scad", "lib/mid.scad"]
+        )
+        self.assertEqual(
+            index.dependencies(os.path.join(self.root, "designs", "one.scad")),
+            ["lib/base.scad", "lib/mid.scad"]
+        )
+
+    def test_update(self):
+        """
+        Only changed files are parsed again when the index is reloaded
+        """
+        index = scad_deps.DependencyIndex(self.root, self.index_path)
+        index.update()
+        reloaded = scad_deps.DependencyIndex(self.root, self.index_path)
+        self.assertEqual(reloaded.update(), 0)
+        three = os.path.join(self.root, "designs", "three.scad")
+        write(three, "use <../lib/base.scad>\ncube(1);\n")
+        # Make sure the modification time changes on coarse clocks
+        future = time.time() + 10
+        os.utime(three, (future, future))
+        self.assertEqual(reloaded.update(), 1)
+        self.assertIn("designs/three.scad", reloaded.affected([os.path.join(self.root, "lib", "base.scad")]))
+
+if __name__ == '__main__':
+    unittest.main()
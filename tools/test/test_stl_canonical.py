@@ -0,0 +1,77 @@
+#! /usr/bin/env python3
+'''
+Tests for writing STLs in canonical form.
+'''
+
+import os
+import shutil
+import sys
+import unittest
+from tempfile import mkdtemp
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import stl_canonical  # pylint: disable=wrong-import-position
+import stl_mesh  # pylint: disable=wrong-import-position
+from test_stl_mesh import box_triangles, write_ascii_stl, write_binary_stl  # pylint: disable=wrong-import-position
+
+
+class TestCanonicalStl(unittest.TestCase):
+    """
+    The same mesh gives the same bytes however it was written
+    """
+    def setUp(self):
+        self.folder = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_same_hash(self):
+        """
+        Reordered triangles, rotated vertices, tiny rounding differences and
+        ASCII rather than binary all give the same canonical STL
+        """
+        box = box_triangles(offset=(0.5, -2, 10))
+        rng = np.random.default_rng(1)
+        shuffled = box[rng.permutation(len(box))]
+        shift = rng.integers(0, 3, len(box))
+        shuffled = np.array([np.roll(triangle, s, axis=0) for triangle, s in zip(shuffled, shift)])
+        shuffled += 1e-6
+        first = os.path.join(self.folder, "first.stl")
+        second = os.path.join(self.folder, "second.stl")
+        write_binary_stl(first, box)
+        write_ascii_stl(second, shuffled)
+        self.assertEqual(stl_canonical.mesh_hash(first), stl_canonical.mesh_hash(second))
+        digest = stl_canonical.write_canonical_stl(second, second)
+        with open(second, 'rb') as file_obj:
+            data = file_obj.read()
+        self.assertEqual(data, stl_canonical.canonical_stl_bytes(box))
+        self.assertEqual(digest, stl_canonical.mesh_hash(first))
+
+    def test_winding_kept(self):
+        """
+        Canonicalising doesn't flip any triangles, so the volume is unchanged
+        """
+        box = box_triangles()
+        canonical = stl_canonical.canonical_triangles(box)*stl_canonical.DEFAULT_QUANTUM
+        self.assertAlmostEqual(stl_mesh.mesh_metrics(canonical)["volume"], 6)
+        self.assertEqual(canonical[:, 0].tolist(), sorted(canonical[:, 0].tolist()))
+
+    def test_repeated_vertex(self):
+        """
+        A degenerate triangle with a repeated vertex gives the same form from
+        any of its rotations
+        """
+        vertex_a, vertex_b = [0, 0, 0], [1, 2, 3]
+        first = stl_canonical.canonical_order([[vertex_a, vertex_a, vertex_b]])
+        for rotation in [[vertex_a, vertex_b, vertex_a], [vertex_b, vertex_a, vertex_a]]:
+            self.assertEqual(stl_canonical.canonical_order([rotation]).tolist(), first.tolist())
+        self.assertEqual(
+            stl_canonical.canonical_stl_bytes([[vertex_a, vertex_b, vertex_a]]),
+            stl_canonical.canonical_stl_bytes([[vertex_a, vertex_a, vertex_b]])
+        )
+
+if __name__ == '__main__':
+    unittest.main()
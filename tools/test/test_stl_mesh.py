@@ -0,0 +1,110 @@
+#! /usr/bin/env python3
+'''
+Tests for reading and measuring STL files.
+'''
+
+import os
+import shutil
+import sys
+import unittest
+from tempfile import mkdtemp
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import stl_mesh  # pylint: disable=wrong-import-position
+
+
+def box_triangles(size=(1.0, 2.0, 3.0), offset=(0.0, 0.0, 0.0)):
+    """
+    The 12 triangles of a box, with the normals pointing out.
+    """
+    corners = np.array(
+        [[x, y, z] for x in (0, 1) for y in (0, 1) for z in (0, 1)], dtype=np.float64
+    )*size + offset
+    faces = [
+        [0, 1, 3], [0, 3, 2], [4, 6, 7], [4, 7, 5], [0, 4, 5], [0, 5, 1],
+        [2, 3, 7], [2, 7, 6], [0, 2, 6], [0, 6, 4], [1, 5, 7], [1, 7, 3],
+    ]
+    return corners[faces]
+
+def write_binary_stl(path, triangles):
+    """
+    Write triangles as a binary STL with zero normals.
+    """
+    records = np.zeros(len(triangles), dtype=stl_mesh.STL_DTYPE)
+    records["vertices"] = triangles
+    with open(path, 'wb') as file_obj:
+        file_obj.write(b"test".ljust(80, b" "))
+        file_obj.write(np.uint32(len(triangles)).tobytes())
+        file_obj.write(records.tobytes())
+
+def write_ascii_stl(path, triangles):
+    """
+    Write triangles as an ASCII STL.
+    """
+    with open(path, 'w') as file_obj:
+        file_obj.write("solid test\n")
+        for triangle in triangles:
+            file_obj.write("facet normal 0 0 0\nouter loop\n")
+            for vertex in triangle:
+                file_obj.write("vertex {} {} {}\n".format(*vertex))
+            file_obj.write("endloop\nendfacet\n")
+        file_obj.write("endsolid test\n")
+
+class TestStlMesh(unittest.TestCase):
+    """
+    Binary and ASCII STLs of a box give its size, area, volume and centre
+    """
+    def setUp(self):
+        self.folder = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def check_box(self, metrics):
+        """
+        Check the metrics of the box from box_triangles((1, 2, 3), (1, 1, 1))
+        """
+        self.assertEqual(metrics["triangles"], 12)
+        self.assertEqual(metrics["bbox_min"], [1, 1, 1])
+        self.assertEqual(metrics["bbox_max"], [2, 3, 4])
+        self.assertAlmostEqual(metrics["area"], 22)
+        self.assertAlmostEqual(metrics["volume"], 6)
+        np.testing.assert_allclose(metrics["centroid"], [1.5, 2, 2.5])
+
+    def test_binary(self):
+        """
+        Binary STLs are memory mapped
+        """
+        path = os.path.join(self.folder, "box.stl")
+        write_binary_stl(path, box_triangles(offset=(1, 1, 1)))
+        self.assertTrue(stl_mesh.is_binary_stl(path))
+        self.assertIsInstance(stl_mesh.map_binary_stl(path), np.memmap)
+        self.check_box(stl_mesh.stl_metrics(path))
+
+    def test_ascii(self):
+        """
+        ASCII STLs are read in blocks
+        """
+        path = os.path.join(self.folder, "box.stl")
+        write_ascii_stl(path, box_triangles(offset=(1, 1, 1)))
+        self.assertFalse(stl_mesh.is_binary_stl(path))
+        blocks = list(stl_mesh.iter_ascii_triangles(path, block=5))
+        self.assertEqual([len(block) for block in blocks], [5, 5, 2])
+        self.check_box(stl_mesh.stl_metrics(path))
+
+    def test_scan(self):
+        """
+        Every STL in a folder is measured
+        """
+        write_binary_stl(os.path.join(self.folder, "a.stl"), box_triangles())
+        os.makedirs(os.path.join(self.folder, "sub"))
+        write_ascii_stl(os.path.join(self.folder, "sub", "b.STL"), box_triangles())
+        results = stl_mesh.scan([self.folder], workers=2)
+        self.assertEqual([os.path.basename(result["path"]) for result in results], ["a.stl", "b.STL"])
+        for result in results:
+            self.assertAlmostEqual(result["volume"], 6)
+
+if __name__ == '__main__':
+    unittest.main()
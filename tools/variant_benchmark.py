@@ -0,0 +1,139 @@
+#! /usr/bin/env python3
+'''
+Compare the render time and output of different versions of a model.
+
+Each variant is a set of -D overrides for the same scad file, typically a
+switch between an old and a new way of making the same shape. Every variant
+is rendered the given number of times (interleaved, so that a change in the
+load on the machine affects them all alike), and the median wall and CPU time,
+facet count, volume and whether the mesh is watertight are reported, along with
+the speed up and the Hausdorff distance from the first variant.
+
+    python tools/variant_benchmark.py tools/benchmarks/threads.scad \\
+        --variant single_polyhedron=false --variant single_polyhedron=true --repeats 3
+
+Variants with more than one override separate them with commas, e.g.
+--variant 'single_polyhedron=true,inner=false'. The results are also written as
+JSON with -o.
+'''
+
+import argparse
+import json
+import shutil
+import os
+import sys
+from statistics import median
+from tempfile import mkdtemp
+
+from mesh_check import check_mesh
+from mesh_regress import sampled_hausdorff
+from openscad_cli import openscad_version, render
+from render_cache import parse_define
+from stl_mesh import load_triangles, mesh_metrics
+
+
+def parse_variant(text):
+    """
+    Parse "name=value,name=value" into a dictionary of overrides. An empty
+    string is the model with no overrides.
+    """
+    if not text:
+        return {}
+    return dict(parse_define(part) for part in text.split(","))
+
+def benchmark_variants(scad_path, variants, repeats=1, timeout=None, samples=20000):
+    """
+    Render every variant `repeats` times, returning a summary for each.
+    """
+    out_dir = mkdtemp(prefix="variant_benchmark_")
+    runs = [[] for _ in variants]
+    try:
+        for repeat in range(repeats):
+            for index, defines in enumerate(variants):
+                stl_path = os.path.join(out_dir, f"{index}_{repeat}.stl")
+                result = render(scad_path, stl_path, defines=defines, timeout=timeout)
+                result["ok"] = result["returncode"] == 0 and os.path.exists(stl_path)
+                runs[index].append(result)
+        summaries = []
+        reference = None
+        for index, defines in enumerate(variants):
+            good = [run for run in runs[index] if run["ok"]]
+            summary = {"defines": defines, "ok": bool(good)}
+            if not good:
+                summary["log"] = runs[index][-1]["log"]
+                summaries.append(summary)
+                continue
+            triangles = load_triangles(good[-1]["output"])
+            cpu_times = [run["cpu_time"] for run in good if run["cpu_time"] is not None]
+            summary.update({
+                "median_wall_time": median(run["wall_time"] for run in good),
+                "median_cpu_time": median(cpu_times) if cpu_times else None,
+                "facets": int(len(triangles)),
+                "volume": abs(mesh_metrics(triangles)["volume"]),
+                "watertight": check_mesh(triangles)["watertight"],
+            })
+            if reference is None:
+                reference = (summary, triangles)
+            else:
+                summary["speed_up"] = reference[0]["median_wall_time"]/summary["median_wall_time"]
+                summary["hausdorff"] = sampled_hausdorff(reference[1], triangles, samples)
+            summaries.append(summary)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return summaries
+
+def print_summaries(summaries, file=sys.stderr):
+    """
+    Print a line for each variant.
+    """
+    for summary in summaries:
+        name = ",".join(f"{key}={value}" for key, value in summary["defines"].items()) or "(defaults)"
+        if not summary["ok"]:
+            print(f"{name}: FAILED", file=file)
+            continue
+        line = (
+            f"{name}: {summary['median_wall_time']:.2f}s, {summary['facets']} facets, "
+            f"volume {summary['volume']:.2f} mm^3, "
+            + ("watertight" if summary["watertight"] else "NOT watertight")
+        )
+        if "speed_up" in summary:
+            line += f", {summary['speed_up']:.1f}x faster, hausdorff {summary['hausdorff']:.4f} mm"
+        print(line, file=file)
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Compare renders of variants of a model.")
+    parser.add_argument("scad", help="scad file to render.")
+    parser.add_argument(
+        "--variant",
+        action="append",
+        default=[],
+        help="Overrides for one variant, name=value,name=value. Give once per variant."
+    )
+    parser.add_argument("--repeats", type=int, default=1, help="Renders per variant.")
+    parser.add_argument("--timeout", type=float, default=None, help="Timeout per render in seconds.")
+    parser.add_argument("--samples", type=int, default=20000, help="Points per surface for the Hausdorff distance.")
+    parser.add_argument("-o", "--output", default=None, help="File to write the JSON results to.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Benchmark the variants, returning 1 if any failed or are not watertight.
+    """
+    args = parse_args(argv)
+    variants = [parse_variant(text) for text in args.variant] or [{}]
+    summaries = benchmark_variants(args.scad, variants, args.repeats, args.timeout, args.samples)
+    print_summaries(summaries)
+    if args.output is not None:
+        with open(args.output, 'w') as file_obj:
+            json.dump(
+                {"openscad_version": openscad_version(), "scad": args.scad, "variants": summaries},
+                file_obj,
+                indent=2
+            )
+    return 0 if all(summary["ok"] and summary["watertight"] for summary in summaries) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())